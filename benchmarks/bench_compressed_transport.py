@@ -0,0 +1,89 @@
+"""
+Measures the bytes transferred and the wall time of downloading and parsing a synthetic repo.yaml, plain and
+through each compressed variant open_compressed_yaml_stream supports.
+
+Usage: python benchmarks/bench_compressed_transport.py [number of apps]
+"""
+import functools
+import gzip
+import http.server
+import lzma
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import sadb.utilities as util
+import sadb.yaml_parse as yaml_parse
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def make_repo_yaml(count: int) -> bytes:
+    lines = []
+    for i in range(count):
+        lines += [
+            f"org.example.App{i}:",
+            f"  name: App {i}",
+            f"  src_pkg_name: org.example.App{i}",
+            f"  summary: A test app {i}",
+            f"  description: {'This is a test app. ' * 20}",
+            "  categories: [Utility, Development]",
+        ]
+    return "\n".join(lines).encode() + b"\n"
+
+
+class CountingHandler(http.server.SimpleHTTPRequestHandler):
+    sent = 0
+
+    def log_message(self, *args):
+        pass
+
+    def copyfile(self, source, outputfile):
+        data = source.read()
+        CountingHandler.sent += len(data)
+        outputfile.write(data)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    with tempfile.TemporaryDirectory() as directory:
+        serve_dir = os.path.join(directory, "www")
+        os.mkdir(serve_dir)
+        data = make_repo_yaml(count)
+        variants = {"": data, ".gz": gzip.compress(data), ".xz": lzma.compress(data)}
+        if zstandard is not None:
+            variants[".zst"] = zstandard.ZstdCompressor(level=10).compress(data)
+
+        handler = functools.partial(CountingHandler, directory=serve_dir)
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}/repo.yaml"
+
+        print(f"{count} apps")
+        print(f"{'variant':<10}{'transferred':>14}{'wall time':>12}")
+        for extension, content in variants.items():
+            # Publish only this variant, so open_compressed_yaml_stream picks it
+            for name in os.listdir(serve_dir):
+                os.remove(os.path.join(serve_dir, name))
+            with open(os.path.join(serve_dir, "repo.yaml" + extension), "wb") as f:
+                f.write(content)
+
+            CountingHandler.sent = 0
+            start = time.perf_counter()
+            stream = util.open_compressed_yaml_stream(url, os.path.join(directory, f"cache{extension}"))
+            with stream:
+                parsed = sum(1 for _ in yaml_parse.iter_apps_from_yaml(stream))
+                stream.commit()
+            seconds = time.perf_counter() - start
+            assert parsed == count
+            print(f"{extension or 'plain':<10}{CountingHandler.sent / 1e6:11.2f} MB{seconds:10.2f} s")
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Measures the latency of readers while update_db writes to the database, with SQLite's default connection
+settings (rollback journal, small cache, no memory mapping) and with the settings connection_pragmas uses by
+default (write-ahead logging, larger cache, memory mapping).
+
+The writer runs in another process and changes every app through WritableDB.sync_apps, as update_db does when
+the whole catalog changed. Meanwhile this process keeps looking up apps and searching through a ReadableDB.
+
+Usage: python benchmarks/bench_concurrent_reads.py [number of apps]
+"""
+import copy
+import multiprocessing
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+import sadb
+import sadb.configuration as cfg
+import sadb.database as db
+
+
+def make_app(i: int, version: int) -> sadb.App:
+    return sadb.App(
+        f"org.example.App{i}", f"App {i} v{version}", "flathub", f"org.example.App{i}",
+        f"https://example.com/{i}.png", "John Doe", f"A test app {i}", "This is a test app. " * 20,
+        ["Utility", "Development"], ["test", "app", str(i)], ["text/plain"], "MIT", sadb.Pricing.FREE,
+        sadb.MobileType.UNKNOWN, sadb.StillRating(i % 6), "", "https://example.com", "", [], "", []
+    )
+
+
+def update(config: cfg.SadbConfig, count: int) -> None:
+    with db.WritableDB(config) as write_db:
+        write_db.sync_apps(make_app(i, 2) for i in range(count))
+
+
+def run(config: cfg.SadbConfig, count: int) -> None:
+    with db.WritableDB(config) as write_db:
+        write_db.add_apps(make_app(i, 1) for i in range(count))
+
+    latencies = []
+    errors = 0
+    writer = multiprocessing.Process(target=update, args=(config, count))
+    with db.ReadableDB(config) as read_db:
+        start = time.perf_counter()
+        writer.start()
+        while writer.is_alive():
+            query_start = time.perf_counter()
+            try:
+                read_db.get_app(f"org.example.App{random.randrange(count)}")
+                read_db.search_apps(f"app {random.randrange(count)}", limit=5)
+            except sqlite3.OperationalError:  # database is locked
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - query_start) * 1000)
+        writer.join()
+        writer_seconds = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"  update took {writer_seconds:.2f} s, {len(latencies)} reads, {errors} failed with database is locked")
+    if latencies:
+        print(f"  read latency p50 {statistics.median(latencies):.2f} ms, "
+              f"p99 {latencies[int(len(latencies) * 0.99)]:.2f} ms, max {latencies[-1]:.2f} ms")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    config = cfg.SadbConfig()
+    defaults = copy.copy(config)
+    defaults.db_wal = False
+    defaults.db_cache_size = 2000  # SQLite's default
+    defaults.db_mmap_size = 0
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, settings in (("SQLite defaults", defaults), ("tuned", config)):
+            settings.db_location = os.path.join(directory, f"{name.split()[0].lower()}.db")
+            print(f"{name}, {count} apps")
+            run(settings, count)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Compares download_yaml with the way it used to collect the body, appending 1 KiB chunks to bytes, for
+10, 100 and 500 MB payloads served from a local HTTP server. The old way copies the whole body on every
+append, so it is only run for payloads up to --old-limit MB.
+
+Usage: python benchmarks/bench_download_yaml.py [sizes in MB...] [--old-limit MB]
+"""
+import argparse
+import functools
+import http.server
+import os
+import tempfile
+import threading
+import time
+
+import requests
+
+import sadb.utilities as util
+
+ENTRY = (
+    "org.example.App:\n"
+    "  name: App\n"
+    "  src_pkg_name: org.example.App\n"
+    "  summary: A test app\n"
+    "  description: This is a test app. This is a test app. This is a test app.\n"
+    "  categories: [Utility, Development]\n"
+).encode()
+
+
+def write_payload(path: str, size: int) -> None:
+    chunk = ENTRY * (util.BLOCK_SIZE // len(ENTRY))
+    with open(path, "wb") as f:
+        while size > 0:
+            f.write(chunk[:size])
+            size -= len(chunk)
+
+
+def old_download_yaml(url: str) -> str:
+    # How download_yaml collected the body before
+    response = requests.get(url, stream=True)
+    response.raise_for_status()
+    yaml_data = b''
+    for data in response.iter_content(1024):
+        yaml_data += data
+    return yaml_data.decode('utf-8')
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("sizes", nargs="*", type=int, default=[10, 100, 500])
+    parser.add_argument("--old-limit", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        handler = functools.partial(QuietHandler, directory=directory)
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        print(f"{'payload':<10}{'bytes +=, 1 KiB':>18}{'download_yaml':>16}")
+        for size in args.sizes:
+            name = f"repo-{size}.yaml"
+            write_payload(os.path.join(directory, name), size * 1000 * 1000)
+            url = f"http://127.0.0.1:{server.server_port}/{name}"
+
+            old = "skipped"
+            if size <= args.old_limit:
+                start = time.perf_counter()
+                old_download_yaml(url)
+                old = f"{time.perf_counter() - start:.2f} s"
+
+            start = time.perf_counter()
+            util.download_yaml(url)
+            new = f"{time.perf_counter() - start:.2f} s"
+            print(f"{f'{size} MB':<10}{old:>18}{new:>16}")
+            os.remove(os.path.join(directory, name))
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Compares decoding every row of the apps table the way ReadableDB used to, eagerly splitting the list
+columns and calling each enum per row, with the row factory used by ReadableDB.get_all_apps.
+
+Usage: python benchmarks/bench_row_decode.py [number of apps]
+"""
+import os
+import sys
+import tempfile
+import timeit
+
+import sadb
+import sadb.configuration as cfg
+import sadb.database as db
+
+
+def make_app(i: int) -> sadb.App:
+    return sadb.App(
+        f"org.example.App{i}", f"App {i}", "flathub", f"org.example.App{i}", f"https://example.com/{i}.png",
+        "John Doe", f"A test app {i}", "This is a test app. " * 20, ["Utility", "Development"],
+        ["test", "app", str(i)], ["text/plain"], "MIT", sadb.Pricing.FREE, sadb.MobileType.UNKNOWN,
+        sadb.StillRating(i % 6), "", "https://example.com", "", ["https://example.com/screenshot.png"], "", []
+    )
+
+
+def eager_column_to_app(column: tuple) -> sadb.App:
+    # The per-row decoding ReadableDB.column_to_app did before the row factory
+    assert len(column) == 21
+    return sadb.App(
+        column[0], column[1], column[2], column[3], column[4], column[5],
+        column[6], column[7], sadb.from_csl(column[8]), sadb.from_csl(column[9]), sadb.from_csl(column[10]),
+        column[11], sadb.Pricing(column[12]), sadb.MobileType(column[13]),
+        sadb.StillRating(column[14]), column[15], column[16], column[17], sadb.from_csl(column[18]),
+        column[19], sadb.from_csl(column[20])
+    )
+
+
+def touch(apps: list) -> None:
+    # Reads the fields a listing shows, so lazily decoded fields are paid for too
+    for app in apps:
+        app.categories, app.pricing, app.still_rating
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    with tempfile.TemporaryDirectory() as directory:
+        config = cfg.SadbConfig()
+        config.db_location = os.path.join(directory, "bench.db")
+        with db.WritableDB(config) as write_db:
+            write_db.add_apps(make_app(i) for i in range(count))
+
+        with db.ReadableDB(config) as read_db:
+            def eager():
+                read_db.c.execute("SELECT * FROM apps")
+                return [eager_column_to_app(column) for column in read_db.c.fetchall()]
+
+            cases = [
+                ("eager decode", eager),
+                ("row factory", read_db.get_all_apps),
+                ("eager decode, fields read", lambda: touch(eager())),
+                ("row factory, fields read", lambda: touch(read_db.get_all_apps())),
+            ]
+            print(f"{count} apps, best of 5")
+            for name, function in cases:
+                seconds = min(timeit.repeat(function, number=1, repeat=5))
+                print(f"{name:<28}{seconds * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -92,10 +92,68 @@ def to_csl(csl: Optional[List[str]]):
     return ",".join(csl)
 
 
+class _CslField:
+    """
+    Descriptor for list attributes of an App that may be given as a comma-separated string, as they are
+    stored in the database. The string is only split the first time the attribute is read.
+    """
+    def __init__(self, empty=None):
+        self.empty = empty  # Called to create the value read when the attribute is None
+
+    def __set_name__(self, owner, name):
+        self.slot = "_" + name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        value = getattr(instance, self.slot)
+        if isinstance(value, str):
+            value = from_csl(value)
+            setattr(instance, self.slot, value)
+        elif value is None and self.empty is not None:
+            value = self.empty()
+            setattr(instance, self.slot, value)
+        return value
+
+    def __set__(self, instance, value):
+        setattr(instance, self.slot, value)
+
+
+class _EnumField:
+    """
+    Descriptor for enum attributes of an App that may be given as the enum's value, as they are stored
+    in the database. The value is only converted the first time the attribute is read.
+    """
+    def __init__(self, enum):
+        self.enum = enum
+        # Lookup table from value to member, faster than calling the enum. None is read as UNKNOWN
+        self.members = {member.value: member for member in enum}
+        self.members[None] = enum(0)
+
+    def __set_name__(self, owner, name):
+        self.slot = "_" + name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        value = getattr(instance, self.slot)
+        if not isinstance(value, self.enum):
+            member = self.members.get(value)
+            value = self.enum(value) if member is None else member
+            setattr(instance, self.slot, value)
+        return value
+
+    def __set__(self, instance, value):
+        setattr(instance, self.slot, value)
+
+
 class App:
     """
     A class used to represent an App.
 
+    Apps use __slots__ to keep their memory use low. The list and enum attributes also accept the
+    comma-separated strings and integers stored in the database, and are only decoded when first read.
+
     ...
 
     Attributes
@@ -143,18 +201,19 @@ class App:
     addons : list
         the addons of the app
     """
-    keywords: List[str] = []
-    mimetypes: List[str] = []
-    app_license: str = "Proprietary"
-    pricing: Pricing = Pricing.UNKNOWN
-    mobile: MobileType = MobileType.UNKNOWN
-    still_rating: StillRating = StillRating.UNKNOWN
-    still_rating_notes: str = ""
-    homepage: str = ""
-    donate_url: str = ""
-    screenshot_urls: List[str] = []
-    demo_url: str = ""
-    addons: List[str] = []
+    __slots__ = (
+        "app_id", "name", "primary_src", "src_pkg_name", "icon_url", "author", "summary", "description",
+        "_categories", "_keywords", "_mimetypes", "app_license", "_pricing", "_mobile", "_still_rating",
+        "still_rating_notes", "homepage", "donate_url", "_screenshot_urls", "demo_url", "_addons"
+    )
+    categories = _CslField()
+    keywords = _CslField(empty=list)
+    mimetypes = _CslField(empty=list)
+    screenshot_urls = _CslField(empty=list)
+    addons = _CslField(empty=list)
+    pricing = _EnumField(Pricing)
+    mobile = _EnumField(MobileType)
+    still_rating = _EnumField(StillRating)
 
     def __init__(
             self, app_id: str, name: str, primary_src: str, src_pkg_name: str,
@@ -200,46 +259,60 @@ class App:
         self.summary = summary
         self.description = description
         self.categories = categories
+        self.keywords = [] if keywords is None else keywords
+        self.mimetypes = [] if mimetypes is None else mimetypes
+        self.app_license = "Proprietary" if app_license is None else app_license
+        self.pricing = Pricing.UNKNOWN if pricing is None else pricing
+        self.mobile = MobileType.UNKNOWN if mobile is None else mobile
+        self.still_rating = StillRating.UNKNOWN if still_rating is None else still_rating
+        self.still_rating_notes = "" if still_rating_notes is None else still_rating_notes
+        self.homepage = "" if homepage is None else homepage
+        self.donate_url = "" if donate_url is None else donate_url
+        self.screenshot_urls = [] if screenshot_urls is None else screenshot_urls
+        self.demo_url = "" if demo_url is None else demo_url
+        self.addons = [] if addons is None else addons
 
-        if keywords is not None:
-            self.keywords = keywords
-
-        if mimetypes is not None:
-            self.mimetypes = mimetypes
-
-        if app_license is not None:
-            self.app_license = app_license
-
-        if pricing is not None:
-            self.pricing = pricing
-
-        if mobile is not None:
-            self.mobile = mobile
-
-        if still_rating is not None:
-            self.still_rating = still_rating
-
-        if still_rating_notes is not None:
-            self.still_rating_notes = still_rating_notes
-
-        if homepage is not None:
-            self.homepage = homepage
-
-        if donate_url is not None:
-            self.donate_url = donate_url
+    @classmethod
+    def from_column(cls, column: tuple) -> "App":
+        """
+        Builds an app from a row of the apps table without going through the constructor.
 
-        if screenshot_urls is not None:
-            self.screenshot_urls = screenshot_urls
+        Parameters:
+            column (tuple): The row, with the columns in the order of the apps table.
 
-        if demo_url is not None:
-            self.demo_url = demo_url
+        Returns:
+            App: The app, with its list and enum fields decoded when first read.
+        """
+        app = cls.__new__(cls)
+        app._load_column(column)
+        return app
+
+    def _load_column(self, column: tuple):
+        (
+            self.app_id, self.name, self.primary_src, self.src_pkg_name, self.icon_url, self.author,
+            self.summary, self.description, self._categories, self._keywords, self._mimetypes, app_license,
+            self._pricing, self._mobile, self._still_rating, still_rating_notes, homepage, donate_url,
+            self._screenshot_urls, demo_url, self._addons
+        ) = column[:21]
+        self.app_license = "Proprietary" if app_license is None else app_license
+        self.still_rating_notes = "" if still_rating_notes is None else still_rating_notes
+        self.homepage = "" if homepage is None else homepage
+        self.donate_url = "" if donate_url is None else donate_url
+        self.demo_url = "" if demo_url is None else demo_url
+
+    def as_dict(self) -> dict:
+        """
+        Returns the attributes of the app by name, decoding any that haven't been read yet.
 
-        if addons is not None:
-            self.addons = addons
+        Returns:
+            dict: The attributes of the app.
+        """
+        names = [slot.lstrip("_") for cls in reversed(type(self).__mro__) for slot in getattr(cls, "__slots__", ())]
+        return {name: getattr(self, name) for name in names}
 
 
 class InstalledApp(App):
-    update_available: bool = False
+    __slots__ = ("update_available",)
 
     def __init__(
         self, update_available: bool,
@@ -260,12 +333,28 @@ class InstalledApp(App):
 
     @classmethod
     def from_app(cls, app: App):
-        return cls(
-            False, app.app_id, app.name, app.primary_src, app.src_pkg_name, app.icon_url, app.author,
-            app.summary, app.description, app.categories, app.keywords, app.mimetypes, app.app_license,
-            app.pricing, app.mobile, app.still_rating, app.still_rating_notes, app.homepage, app.donate_url,
-            app.screenshot_urls, app.demo_url, app.addons
-        )
+        # Copies the stored values directly, so fields the app hasn't decoded yet stay lazy
+        installed_app = cls.__new__(cls)
+        for slot in App.__slots__:
+            setattr(installed_app, slot, getattr(app, slot))
+        installed_app.update_available = False
+        return installed_app
+
+    @classmethod
+    def from_column(cls, column: tuple) -> "InstalledApp":
+        """
+        Builds an installed app from a row of the installed table without going through the constructor.
+
+        Parameters:
+            column (tuple): The row, with the columns in the order of the installed table.
+
+        Returns:
+            InstalledApp: The installed app, with its list and enum fields decoded when first read.
+        """
+        installed_app = cls.__new__(cls)
+        installed_app._load_column(column)
+        installed_app.update_available = bool(column[21])
+        return installed_app
 
     # app_id: str, name: str, primary_src: str, src_pkg_name: str,
     #             icon_url: str, author: str, summary: str, description: str,
@@ -1,17 +1,21 @@
 #!/usr/bin/env python3
+import contextlib
+import json
 import os
 import shutil
-from typing import List
+from typing import Callable, Dict, List, Set
 from urllib.parse import urljoin
 import unittest
 
 import click
 
 import sadb.database as database
+import sadb.mirrors as mirrors
 import sadb.source.manager as source_man
 import sadb.yaml_parse as yaml_parse
 import sadb.configuration as cfg
 import sadb.utilities as util
+import sadb.watcher as watcher
 import sadb.tests as tests
 
 CONFIG = cfg.SadbConfig()
@@ -26,7 +30,7 @@ def cli():
 def check_sources():
     """Tests to make sure all sources are correctly configured."""
     source_yaml = util.download_yaml(
-        urljoin(CONFIG.repo_url, "sourceconf.yaml"), verbose=CONFIG.verbose
+        urljoin(CONFIG.repo_url, "sourceconf.yaml"), verbose=CONFIG.verbose, block_size=CONFIG.download_block_size
     )
     correct, error = source_man.check_sources(source_yaml)
     if not correct:
@@ -46,25 +50,72 @@ def update_source():
 
     if CONFIG.verbose:
         print("Downloading source data (1/2):")
-    source_yaml = util.download_yaml(urljoin(CONFIG.repo_url, "sourceconf.yaml"), verbose=CONFIG.verbose)
-    if CONFIG.verbose:
-        print("\nGenerating sources (2/2)")
-    source_man.generate_sources(source_yaml)
+    # The cached copy is used if sourceconf.yaml did not change, the sources are still generated again from it
+    # so that update_source repairs broken source files
+    source_stream = util.open_cached_yaml_stream(
+        urljoin(CONFIG.repo_url, "sourceconf.yaml"), CONFIG.download_cache_location, verbose=CONFIG.verbose,
+        force=True
+    )
+    with source_stream:
+        source_yaml = source_stream.read().decode("utf-8")
+        if CONFIG.verbose:
+            print("\nGenerating sources (2/2)")
+        source_man.generate_sources(source_yaml)
+        source_stream.commit()
     exit(0)
 
 
 @click.command()
-def update_db(start_step: int = 0):
+@click.option("--full", is_flag=True, help="Rebuild the database from scratch instead of only applying changes.")
+def update_db(start_step: int = 0, full: bool = False):
     """Updates the database with the latest yaml data."""
     if CONFIG.verbose:
-        print(f"\nDownloading yaml database ({start_step + 1}/{start_step + 2}):")
-    db_yaml = util.download_yaml(urljoin(CONFIG.repo_url, "repo.yaml"), verbose=CONFIG.verbose)
-    # Add apps to database
-    if CONFIG.verbose:
-        print(f"\n(Re)generating database ({start_step + 2}/{start_step + 2})")
-    with database.WritableDB(CONFIG) as db:
-        db.clear_db()
-        db.add_apps(yaml_parse.get_apps_from_yaml(db_yaml))
+        print(f"\nDownloading yaml database and (re)generating database ({start_step + 1}/{start_step + 1}):")
+    # Every repository is downloaded at once, and their catalogs are merged by priority. The cached copies of
+    # unchanged files are opened too, in case the database or snapshot no longer holds what they contain.
+    urls = [urljoin(url, "repo.yaml") for url in CONFIG.repo_urls]
+    repo_yamls = util.open_yaml_streams(
+        urls, CONFIG.download_cache_location, verbose=CONFIG.verbose, force=True,
+        mirrors={urljoin(CONFIG.repo_url, "repo.yaml"): rank_repo_mirrors()}
+    )
+    # Apps are parsed and written while a single repository's yaml is still downloading
+    with contextlib.ExitStack() as stack, database.WritableDB(CONFIG) as db:
+        for repo_yaml in repo_yamls:
+            stack.enter_context(repo_yaml)
+        if not full and all(repo_yaml.cached for repo_yaml in repo_yamls) and \
+                os.path.exists(CONFIG.catalog_location) and \
+                db.get_imported_files() == imported_files(urls, repo_yamls):
+            if CONFIG.verbose:
+                print("Database is already up to date.")
+            return
+        apps = yaml_parse.iter_apps_from_yamls(repo_yamls)
+        if full:
+            db.rebuild(apps)  # Readers keep the old catalog until the new one is complete
+        else:
+            report = db.sync_apps(apps)
+            if CONFIG.verbose:
+                print(f"{report.added} added, {report.updated} updated, {report.removed} removed")
+        db.write_snapshot(CONFIG.catalog_location)
+        for repo_yaml in repo_yamls:
+            repo_yaml.commit()  # Only skip the next download once this one made it into the database
+        db.set_imported_files(imported_files(urls, repo_yamls))
+
+
+def imported_files(urls: List[str], repo_yamls: list) -> Dict[str, str]:
+    # The validators tell which copy of each file was imported, whichever mirror and compression it came from
+    return {url: json.dumps(repo_yaml.validators, sort_keys=True) for url, repo_yaml in zip(urls, repo_yamls)}
+
+
+def rank_repo_mirrors(force: bool = False) -> List[str]:
+    urls = [urljoin(url, "repo.yaml") for url in [CONFIG.repo_url] + CONFIG.mirror_urls]
+    return mirrors.rank_mirrors(urls, CONFIG.mirror_ranking_location, CONFIG.mirror_ttl, force)
+
+
+@click.command()
+def rank_mirrors():
+    """Measures the speed of the repository mirrors and ranks them."""
+    for rank, url in enumerate(rank_repo_mirrors(force=True), 1):
+        print(f"{rank}. {url}")
 
 
 @click.command()
@@ -85,12 +136,70 @@ def get_db_location():
 
 
 @click.command()
-def update_installed():
+@click.option("--online", is_flag=True, help="Ask every remote for updates instead of using their cached metadata.")
+def update_installed(online: bool = False):
     """Updates the installed apps database."""
     with database.WritableDB(CONFIG) as db:
-        db.clear_installed_apps()
-        for source in source_man.sources.values():
-            source.add_installed_to_db(db)
+        sync_installed(db, online)
+
+
+def sync_installed(db: database.WritableDB, online: bool = False):
+    installed_apps = [app for source in source_man.sources.values() for app in source.get_installed(db, online)]
+    # Only the apps that were installed, removed or changed are written
+    report = db.sync_installed_apps(installed_apps)
+    if CONFIG.verbose:
+        print(f"{report.added} added, {report.updated} updated, {report.removed} removed")
+
+
+@click.command()
+@click.option("--debounce", default=0.5, help="Seconds without changes to wait for before updating.")
+def watch_installed(debounce: float = 0.5):
+    """Keeps the installed apps database up to date as apps are installed and removed."""
+    watched_sources = [(source, source.watch_paths()) for source in source_man.sources.values()]
+    with database.WritableDB(CONFIG) as db:
+        # After a failed sync, such as when update_db held the database for longer than db_busy_timeout,
+        # every installed app is synced again on the next change instead of only the changed ones
+        full_sync = not try_sync(db, lambda: sync_installed(db))
+        for changes in watcher.watch([path for _, paths in watched_sources for path in paths], debounce):
+            if full_sync:
+                full_sync = not try_sync(db, lambda: sync_installed(db))
+                continue
+            full_sync = not try_sync(db, lambda: sync_changes(db, watched_sources, changes))
+
+
+def sync_changes(db: database.WritableDB, watched_sources: list, changes: Dict[str, Set[str]]):
+    # The changes of every source are committed together, or not at all
+    with db.batch():
+        for source, paths in watched_sources:
+            source_changes = {path: names for path, names in changes.items() if path in paths}
+            if not source_changes:
+                continue
+            report = source.sync_changes(db, source_changes)
+            if CONFIG.verbose:
+                print(f"{report.added} added, {report.updated} updated, {report.removed} removed")
+
+
+def try_sync(db: database.WritableDB, sync: Callable[[], None]) -> bool:
+    try:
+        sync()
+    except Exception as error:
+        db.conn.rollback()
+        print(f"Failed to update installed apps, retrying on the next change: {error}")
+        return False
+    return True
+
+
+@click.command()
+@click.option("--force", is_flag=True, help="Refresh metadata even if it is still fresh.")
+def refresh_remotes(force: bool = False):
+    """Refreshes the cached remote metadata used to find updates. (Requires root)"""
+    if os.geteuid() != 0:
+        print("This command must be run as root.")
+        exit(1)
+    for source in source_man.sources.values():
+        refreshed = source.refresh_remotes(CONFIG, force)
+        if CONFIG.verbose and refreshed:
+            print(f"Refreshed {', '.join(refreshed)}")
 
 
 @click.command(hidden=True)
@@ -105,7 +214,10 @@ cli.add_command(check_sources)
 cli.add_command(update_source)
 cli.add_command(update_db)
 cli.add_command(update)
+cli.add_command(rank_mirrors)
 cli.add_command(update_installed)
+cli.add_command(refresh_remotes)
+cli.add_command(watch_installed)
 cli.add_command(get_db_location)
 cli.add_command(run_tests)
 
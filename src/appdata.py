@@ -0,0 +1,74 @@
+import gzip
+import multiprocessing
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional
+from xml.etree import ElementTree as etree
+
+# Number of appdata files from which they are extracted in a process pool
+PARALLEL_THRESHOLD = 8
+
+
+def extract_components(appdata: List[Optional[bytes]]) -> List[Optional[bytes]]:
+    """
+    Extracts the component of each of the given appdata files, see extract_component.
+
+    The work is spread over a process pool once there are at least PARALLEL_THRESHOLD files. A file that cannot be
+    decompressed or parsed gets None without affecting the others.
+
+    Args:
+        appdata (List[Optional[bytes]]): The gzipped appdata of each ref, None for those that could not be loaded.
+
+    Returns:
+        List[Optional[bytes]]: The component XML of each file, in the same order.
+    """
+    if len(appdata) >= PARALLEL_THRESHOLD:
+        # Forking this process would copy the GLib and libflatpak threads of the caller, which can deadlock the
+        # workers. They are forked from a forkserver instead, which only preloads this module rather than the main
+        # script. Each worker still runs the main script's imports, as multiprocessing does for every start method
+        # but fork, which is safe in a process that never had those threads.
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["sadb.appdata"])
+        try:
+            with ProcessPoolExecutor(mp_context=context) as executor:
+                # map keeps the order of the files whatever order the workers finish in
+                return list(executor.map(extract_component, appdata, chunksize=4))
+        except (OSError, BrokenProcessPool):
+            pass  # Processes can't be started here, extract the components in this one
+    return [extract_component(data) for data in appdata]
+
+
+def extract_component(appstream_gz: Optional[bytes]) -> Optional[bytes]:
+    """
+    Decompresses the appdata of an installed ref and returns its first component, without other languages.
+
+    Runs in the worker processes of extract_components, so it only deals with bytes and this module must not
+    import gi.
+
+    Args:
+        appstream_gz (Optional[bytes]): The gzipped appdata, None if it could not be loaded.
+
+    Returns:
+        Optional[bytes]: The component XML, None if there is none or the appdata is not valid.
+    """
+    if appstream_gz is None:
+        return None
+    try:
+        return get_component(gzip.decompress(appstream_gz))
+    except (OSError, EOFError, zlib.error, etree.ParseError):
+        return None
+
+
+def get_component(input_xml: bytes, language: str = "en") -> Optional[bytes]:
+    components = etree.fromstring(input_xml)
+    component = components.find("component")
+
+    lang_tag = "{http://www.w3.org/XML/1998/namespace}lang"
+
+    if component is not None:
+        for element in list(component):
+            if lang_tag in element.attrib and element.attrib[lang_tag] != language:
+                component.remove(element)
+        return etree.tostring(component, encoding='utf-8')
+    return None
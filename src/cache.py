@@ -0,0 +1,100 @@
+import json
+import os
+import sqlite3
+from typing import Any, Optional
+
+import sadb.utilities as utilities
+
+
+class DiskCache:
+    """
+    A small persistent key-value cache stored in an SQLite database.
+
+    Each key holds a single value together with the version it was computed for, such as the deployed commit of a
+    Flatpak ref. Reading a key with a different version misses, and setting it replaces the old version. Once the
+    cache holds more than max_entries keys, the least recently used ones are evicted.
+
+    Values must be JSON serializable. Changes are committed when the cache is closed.
+
+    Attributes:
+        path (str): The location of the cache database.
+        max_entries (int): The maximum number of keys kept.
+    """
+    def __init__(self, path: str, max_entries: int = 1000):
+        """
+        Opens the cache at the given path, creating it if it does not exist.
+
+        Args:
+            path (str): The location of the cache database.
+            max_entries (int): The maximum number of keys kept.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        new_cache = not os.path.exists(path)
+        if new_cache:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key text PRIMARY KEY, version text, value text, used int)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS cache_used ON cache(used)")
+        if new_cache and utilities.is_sudo_root():
+            utilities.fix_perms(path)
+        # Increasing counter recording when each key was last used
+        self._clock = self.conn.execute("SELECT ifnull(max(used), 0) FROM cache").fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT count(*) FROM cache").fetchone()[0]
+
+    def _tick(self) -> int:
+        self._clock += 1
+        return self._clock
+
+    def get(self, key: str, version: str) -> Optional[Any]:
+        """
+        Returns the value cached for the given key and version.
+
+        Args:
+            key (str): The key of the value.
+            version (str): The version the value must have been computed for.
+
+        Returns:
+            Optional[Any]: The value, None if it is missing or was computed for another version.
+        """
+        row = self.conn.execute("SELECT version, value FROM cache WHERE key=?", (key,)).fetchone()
+        if row is None or row[0] != version:
+            return None
+        self.conn.execute("UPDATE cache SET used=? WHERE key=?", (self._tick(), key))
+        return json.loads(row[1])
+
+    def set(self, key: str, version: str, value: Any) -> None:
+        """
+        Caches the value of the given key for the given version, evicting the least recently used keys if the
+        cache is full.
+
+        Args:
+            key (str): The key of the value.
+            version (str): The version the value was computed for.
+            value (Any): The value, which must be JSON serializable.
+        """
+        self.conn.execute(
+            "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)", (key, version, json.dumps(value), self._tick())
+        )
+        excess = len(self) - self.max_entries
+        if excess > 0:
+            self.conn.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY used LIMIT ?)", (excess,)
+            )
+
+    def close(self) -> None:
+        """
+        Commits the changes to the cache and closes it.
+        """
+        self.conn.commit()
+        self.conn.close()
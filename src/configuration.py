@@ -1,6 +1,7 @@
 import configparser
 import sadb.utilities as utilities
 import os
+from typing import List
 
 # Path to the configuration file
 _CONFIG_PATH = "/etc/sadb.conf"
@@ -33,8 +34,41 @@ class SadbConfig:
         an instance of ConfigParser
     db_location : str
         the location of the database
+    catalog_location : str
+        the location of the compiled catalog snapshot, next to the database
+    cache_location : str
+        the location of the cache of installed app metadata, next to the database
+    download_cache_location : str
+        the directory where downloaded yaml files are kept, next to the database
+    mirror_ranking_location : str
+        the location of the cached ranking of the mirrors, in the download cache
+    cache_size : int
+        the maximum number of installed apps kept in the cache
+    remote_ttl : int
+        the number of seconds the cached metadata of a remote is used before refresh_remotes downloads it again
+    download_block_size : int
+        the number of bytes read from the connection at a time when downloading yaml files
+    db_wal : bool
+        whether the database uses write-ahead logging, so readers are never blocked by the writer
+    db_cache_size : int
+        the size in KiB of the page cache of each database connection
+    db_mmap_size : int
+        the number of bytes of the database that connections read through memory mapping
+    db_busy_timeout : int
+        the number of milliseconds a connection waits for a lock held by another before failing
     repo_url : str
         the url of the repository
+    extra_repo_urls : List[str]
+        the urls of additional repositories, from the whitespace separated SYSTEM extra_repo_urls
+    user_repo_urls : List[str]
+        the urls of the user's own repositories, from the whitespace separated extra_repo_urls of the user section
+    mirror_urls : List[str]
+        the urls of mirrors of repo_url, from the whitespace separated mirror_urls of the section repo_url comes from
+    mirror_ttl : int
+        the number of seconds a ranking of the mirrors is used before they are probed again
+    repo_urls : List[str]
+        the urls of all repositories whose catalogs are merged, highest priority first: the user's extra_repo_urls,
+        repo_url, then the system extra_repo_urls
     verbose : bool
         verbosity flag, not set in config file, but used in the program
 
@@ -47,6 +81,17 @@ class SadbConfig:
     config: configparser.ConfigParser = configparser.ConfigParser()
     db_location: str = os.fspath(os.path.join("/home", _USER, ".local", "share", "sadb", "sadb.db"))
     repo_url: str
+    extra_repo_urls: List[str] = []
+    user_repo_urls: List[str] = []
+    mirror_urls: List[str] = []
+    mirror_ttl: int = 24 * 60 * 60
+    db_wal: bool = True
+    db_cache_size: int = 16 * 1024
+    db_mmap_size: int = 256 * 1024 * 1024
+    db_busy_timeout: int = 5000
+    cache_size: int = 1000
+    remote_ttl: int = 6 * 60 * 60
+    download_block_size: int = 1024 * 1024
     verbose: bool = False
 
     def __init__(self):
@@ -68,17 +113,57 @@ class SadbConfig:
         except KeyError:
             raise ConfigException("Missing SYSTEM repo_url")
 
+        self.extra_repo_urls = self.config["SYSTEM"].get("extra_repo_urls", "").split()
+        self.mirror_urls = self.config["SYSTEM"].get("mirror_urls", "").split()
+
         if "db_location" in self.config["SYSTEM"]:
             self.db_location = self.config["SYSTEM"]["db_location"]
 
+        for option in ("cache_size", "remote_ttl", "download_block_size", "mirror_ttl",
+                       "db_cache_size", "db_mmap_size", "db_busy_timeout"):
+            if option in self.config["SYSTEM"]:
+                try:
+                    setattr(self, option, self.config["SYSTEM"].getint(option))
+                except ValueError:
+                    raise ConfigException(f"SYSTEM {option} must be a number")
+        if "db_wal" in self.config["SYSTEM"]:
+            try:
+                self.db_wal = self.config["SYSTEM"].getboolean("db_wal")
+            except ValueError:
+                raise ConfigException("SYSTEM db_wal must be yes or no")
+
         if _USER in self.config.sections():
             user_config = self.config[_USER]
             if "repo_url" in user_config:
                 self.repo_url = user_config["repo_url"]
+                # The system mirrors are mirrors of the system repo_url
+                self.mirror_urls = user_config.get("mirror_urls", "").split()
+            self.user_repo_urls = user_config.get("extra_repo_urls", "").split()
             if "db_location" in user_config:
                 check_path_valid(user_config["db_location"])
                 self.db_location = user_config["db_location"]
 
+    @property
+    def repo_urls(self) -> List[str]:
+        urls = self.user_repo_urls + [self.repo_url] + self.extra_repo_urls
+        return list(dict.fromkeys(urls))  # Drop repeated urls, keeping the first
+
+    @property
+    def catalog_location(self) -> str:
+        return os.path.splitext(self.db_location)[0] + ".catalog"
+
+    @property
+    def cache_location(self) -> str:
+        return os.path.join(os.path.dirname(self.db_location), "cache.db")
+
+    @property
+    def download_cache_location(self) -> str:
+        return os.path.join(os.path.dirname(self.db_location), "downloads")
+
+    @property
+    def mirror_ranking_location(self) -> str:
+        return os.path.join(self.download_cache_location, "mirrors.json")
+
 
 def check_path_valid(path: str, section: str) -> bool:
     """
@@ -98,4 +183,4 @@ def check_path_valid(path: str, section: str) -> bool:
     """
 
     if not os.path.exists(path):
-        raise ConfigException(f"Path {path} for {section} does not exist")
\ No newline at end of file
+        raise ConfigException(f"Path {path} for {section} does not exist")
@@ -1,6 +1,11 @@
-from typing import List, Optional
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
 
+import contextlib
+import hashlib
+import mmap
+import re
 import sqlite3
+import struct
 import sadb
 import sadb.utilities as utilities
 from sadb.configuration import SadbConfig
@@ -12,6 +17,300 @@ tcsl = sadb.to_csl
 fcsl = sadb.from_csl
 
 
+# Version of the database schema, stored in the database's user_version pragma
+SCHEMA_VERSION = 7
+
+_APP_COLUMNS = '''id text PRIMARY KEY, name text, primary_src text, src_pkg_name text, icon_url text,
+    author text, summary text, description text, categories text, keywords text,
+    mimetypes text, license text, pricing int, mobile int, still_rating int,
+    still_rating_notes text, homepage text, donate_url text, screenshot_urls text,
+    demo_url text, addons text'''
+
+# Explicit column list used when reading apps, so rows keep the layout App.from_column expects
+_APP_FIELDS = tuple(definition.split()[0] for definition in _APP_COLUMNS.split(","))
+_APP_SELECT = ", ".join(_APP_FIELDS)
+_INSTALLED_SELECT = _APP_SELECT + ", update_available"
+_APP_SELECT_QUALIFIED = ", ".join("apps." + field for field in _APP_FIELDS)
+
+# Tables holding one row per value of an app's list fields, as (table, value column, App attribute)
+_LINK_TABLES = (
+    ("app_categories", "category", "categories"),
+    ("app_keywords", "keyword", "keywords"),
+    ("app_mimetypes", "mimetype", "mimetypes")
+)
+
+# Rows of the apps table end with the content_hash of the rest of the row, see _app_row.
+# An app with an existing id is updated in place rather than replaced, so the update triggers keep apps_fts and
+# the link tables in sync whatever the settings of the connection.
+_INSERT_APP = f'''INSERT INTO apps ({_APP_SELECT}, content_hash) VALUES ({','.join('?' * 22)})
+    ON CONFLICT(id) DO UPDATE SET {', '.join(f'{field}=excluded.{field}' for field in _APP_FIELDS[1:])},
+    content_hash=excluded.content_hash'''
+_INSERT_INSTALLED_APP = "INSERT OR REPLACE INTO installed VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)"
+
+# Number of rows written per executemany call when adding many apps
+BATCH_SIZE = 500
+
+# Settings of the connection building a shadow database in WritableDB.rebuild. Nothing else uses the file until it
+# is complete, so it needs no journal, no syncing and no locking between statements. Only the main database is
+# set, not the live database attached to it.
+_BULK_LOAD_PRAGMAS = (
+    "main.journal_mode = OFF",
+    "main.synchronous = OFF",
+    "main.locking_mode = EXCLUSIVE",
+    "temp_store = MEMORY",
+    "main.cache_size = -131072"  # KiB
+)
+
+
+def connection_pragmas(config: SadbConfig, writable: bool) -> List[str]:
+    """
+    Returns the PRAGMA statements configuring a connection to the database for its role.
+
+    Parameters:
+        config (SadbConfig): The configuration with the connection settings.
+        writable (bool): Whether the connection is the writer, rather than a reader.
+
+    Returns:
+        List[str]: The statements, without the PRAGMA keyword.
+    """
+    pragmas = [
+        f"busy_timeout = {int(config.db_busy_timeout)}",
+        f"cache_size = -{int(config.db_cache_size)}",  # Negative sizes are in KiB
+        f"mmap_size = {int(config.db_mmap_size)}",
+        "temp_store = MEMORY"
+    ]
+    if writable:
+        # The journal mode is stored in the file, readers follow what the writer chose.
+        # With write-ahead logging, syncing at checkpoints only can't corrupt the database, it can at most lose
+        # the last transactions on power loss.
+        pragmas += [
+            "journal_mode = WAL" if config.db_wal else "journal_mode = DELETE",
+            "synchronous = NORMAL" if config.db_wal else "synchronous = FULL"
+        ]
+    return pragmas
+
+
+def connect(config: SadbConfig, writable: bool = False, path: Optional[str] = None) -> sqlite3.Connection:
+    """
+    Opens a connection to the database, configured for its role by connection_pragmas.
+
+    Parameters:
+        config (SadbConfig): The configuration of the database.
+        writable (bool): Whether to open the writer connection, rather than a read-only one.
+        path (Optional[str]): The location of the database, config.db_location if None.
+
+    Returns:
+        sqlite3.Connection: The connection.
+    """
+    path = path or config.db_location
+    timeout = config.db_busy_timeout / 1000
+    if writable:
+        conn = sqlite3.connect(path, timeout=timeout)
+    else:
+        # Use uri workaround to open in read-only mode
+        file_uri = urlunparse(urlparse(os.path.abspath(path))._replace(scheme='file')) + "?mode=ro"
+        conn = sqlite3.connect(file_uri, uri=True, timeout=timeout)
+    for pragma in connection_pragmas(config, writable):
+        conn.execute(f"PRAGMA {pragma}")
+    return conn
+
+
+def _fsync_directory(path: str) -> None:
+    """
+    Syncs the directory holding the given file, which makes renaming the file over another one durable.
+    """
+    directory = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+
+def _app_row_factory(cursor: sqlite3.Cursor, row: tuple) -> sadb.App:
+    return sadb.App.from_column(row)
+
+
+def _installed_app_row_factory(cursor: sqlite3.Cursor, row: tuple) -> sadb.InstalledApp:
+    return sadb.InstalledApp.from_column(row)
+
+
+def _insert_links(c: sqlite3.Cursor, apps: List[sadb.App]) -> None:
+    """
+    Fills the link tables with the categories, keywords and mimetypes of the given apps.
+
+    Must run after the apps are inserted, as updating an app row deletes its links.
+    """
+    for table, _, attribute in _LINK_TABLES:
+        c.executemany(f"INSERT OR IGNORE INTO {table} VALUES (?, ?)", [
+            (app.app_id, value)
+            for app in apps if app.app_id is not None
+            for value in getattr(app, attribute) or () if value
+        ])
+
+
+def _table_exists(c: sqlite3.Cursor, table: str) -> bool:
+    c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,))
+    return c.fetchone() is not None
+
+
+def _migrate_v1(c: sqlite3.Cursor):
+    """
+    Adds primary keys and indexes to the apps and installed tables, keeping any existing rows.
+    """
+    tables = {
+        "apps": _APP_COLUMNS,
+        "installed": _APP_COLUMNS + ", update_available int"
+    }
+    for table, columns in tables.items():
+        old_table = None
+        if _table_exists(c, table):
+            old_table = f"{table}_v0"
+            c.execute(f"ALTER TABLE {table} RENAME TO {old_table}")
+        c.execute(f"CREATE TABLE {table} ({columns})")
+        c.execute(f"CREATE UNIQUE INDEX {table}_src_pkg ON {table} (primary_src, src_pkg_name)")
+        c.execute(f"CREATE INDEX {table}_src_pkg_name ON {table} (src_pkg_name)")
+        if old_table is not None:
+            # Rows with a duplicate id or package are dropped, the old schema allowed them by mistake
+            c.execute(f"INSERT OR IGNORE INTO {table} SELECT * FROM {old_table}")
+            c.execute(f"DROP TABLE {old_table}")
+    c.execute("CREATE INDEX installed_update_available ON installed (update_available)")
+
+
+def _migrate_v2(c: sqlite3.Cursor):
+    """
+    Adds the apps_fts full-text index over the apps table, kept in sync by triggers.
+    """
+    # External content table, the text itself is only stored in apps
+    c.execute('''CREATE VIRTUAL TABLE apps_fts USING fts5
+        (name, summary, description, keywords, content='apps', content_rowid='rowid',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3')''')
+    # Matches in the name count the most, matches in the description the least
+    c.execute("INSERT INTO apps_fts(apps_fts, rank) VALUES ('rank', 'bm25(10.0, 5.0, 1.0, 3.0)')")
+    c.execute('''CREATE TRIGGER apps_fts_insert AFTER INSERT ON apps BEGIN
+        INSERT INTO apps_fts(rowid, name, summary, description, keywords)
+            VALUES (new.rowid, new.name, new.summary, new.description, new.keywords);
+        END''')
+    c.execute('''CREATE TRIGGER apps_fts_delete AFTER DELETE ON apps BEGIN
+        INSERT INTO apps_fts(apps_fts, rowid, name, summary, description, keywords)
+            VALUES ('delete', old.rowid, old.name, old.summary, old.description, old.keywords);
+        END''')
+    c.execute('''CREATE TRIGGER apps_fts_update AFTER UPDATE ON apps BEGIN
+        INSERT INTO apps_fts(apps_fts, rowid, name, summary, description, keywords)
+            VALUES ('delete', old.rowid, old.name, old.summary, old.description, old.keywords);
+        INSERT INTO apps_fts(rowid, name, summary, description, keywords)
+            VALUES (new.rowid, new.name, new.summary, new.description, new.keywords);
+        END''')
+    c.execute("INSERT INTO apps_fts(apps_fts) VALUES ('rebuild')")
+
+
+def _migrate_v3(c: sqlite3.Cursor):
+    """
+    Adds the indexes used to page through the apps by name and by rating.
+    """
+    c.execute("CREATE INDEX apps_name ON apps(name, id)")
+    c.execute("CREATE INDEX apps_rating ON apps(still_rating DESC, name, id)")
+
+
+def _migrate_v4(c: sqlite3.Cursor):
+    """
+    Adds the app_categories, app_keywords and app_mimetypes tables, which index the values of those list
+    fields. Links are removed by a trigger when their app is deleted or replaced.
+    """
+    for table, column, _ in _LINK_TABLES:
+        c.execute(f'''CREATE TABLE {table}
+            (app_id text NOT NULL, {column} text NOT NULL, PRIMARY KEY ({column}, app_id)) WITHOUT ROWID''')
+        c.execute(f"CREATE INDEX {table}_app_id ON {table}(app_id)")
+    c.execute('''CREATE TRIGGER apps_links_delete AFTER DELETE ON apps BEGIN
+        DELETE FROM app_categories WHERE app_id = old.id;
+        DELETE FROM app_keywords WHERE app_id = old.id;
+        DELETE FROM app_mimetypes WHERE app_id = old.id;
+        END''')
+    c.execute(f"SELECT {_APP_SELECT} FROM apps")
+    while True:
+        rows = c.fetchmany(BATCH_SIZE)
+        if not rows:
+            break
+        _insert_links(c.connection.cursor(), [sadb.App.from_column(row) for row in rows])
+
+
+def _migrate_v5(c: sqlite3.Cursor):
+    """
+    Adds the content_hash column to the apps table, which sync_apps compares new rows against, filled in from
+    the stored rows.
+    """
+    c.execute("ALTER TABLE apps ADD COLUMN content_hash blob")
+    last_rowid = -1
+    while True:
+        # Rows are read a page at a time, as the table can't be changed while a query is reading it
+        c.execute(f"SELECT rowid, {_APP_SELECT} FROM apps WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                  (last_rowid, BATCH_SIZE))
+        rows = c.fetchall()
+        if not rows:
+            break
+        c.executemany("UPDATE apps SET content_hash=? WHERE rowid=?",
+                      [(column_hash(row[1:]), row[0]) for row in rows])
+        last_rowid = rows[-1][0]
+
+
+def _migrate_v6(c: sqlite3.Cursor):
+    """
+    Adds the trigger removing the links of an app when it is updated, as apps are now updated in place instead
+    of replaced. The link tables and apps_fts are rebuilt, as apps replaced by connections without recursive
+    triggers could leave stale entries behind.
+    """
+    c.execute('''CREATE TRIGGER apps_links_update AFTER UPDATE ON apps BEGIN
+        DELETE FROM app_categories WHERE app_id = old.id;
+        DELETE FROM app_keywords WHERE app_id = old.id;
+        DELETE FROM app_mimetypes WHERE app_id = old.id;
+        END''')
+    for table, _, _ in _LINK_TABLES:
+        c.execute(f"DELETE FROM {table}")
+    c.execute(f"SELECT {_APP_SELECT} FROM apps")
+    while True:
+        rows = c.fetchmany(BATCH_SIZE)
+        if not rows:
+            break
+        _insert_links(c.connection.cursor(), [sadb.App.from_column(row) for row in rows])
+    c.execute("INSERT INTO apps_fts(apps_fts) VALUES ('rebuild')")
+
+
+def _migrate_v7(c: sqlite3.Cursor):
+    """
+    Adds the table recording the validators of the repository files the apps table was last imported from.
+    """
+    c.execute("CREATE TABLE imported_files (url text PRIMARY KEY, validators text NOT NULL)")
+
+
+# Functions upgrading the schema to the version they are keyed by
+_MIGRATIONS = {
+    1: _migrate_v1,
+    2: _migrate_v2,
+    3: _migrate_v3,
+    4: _migrate_v4,
+    5: _migrate_v5,
+    6: _migrate_v6,
+    7: _migrate_v7
+}
+
+
+def fts_query(query: str) -> str:
+    """
+    Converts text typed by a user to an FTS5 query matching apps containing every word.
+
+    The last word is matched as a prefix so results show up while the user is still typing.
+
+    Parameters:
+        query (str): The text to search for.
+
+    Returns:
+        str: The FTS5 query, or an empty string if the text contains no words.
+    """
+    words = re.findall(r"\w+", query)
+    if not words:
+        return ""
+    return " ".join(f'"{word}"' for word in words) + "*"
+
+
 # Function to check if the database is in the correct format
 def is_valid_sqlite_db(path) -> bool:
     """
@@ -35,6 +334,170 @@ def is_valid_sqlite_db(path) -> bool:
         return out
 
 
+def column_hash(column: tuple) -> bytes:
+    """
+    Returns a digest of a database row, used to detect changed apps without comparing every field.
+
+    Parameters:
+        column (tuple): The row, as stored in the database or built by WritableDB.app_to_column.
+
+    Returns:
+        bytes: The digest of the row.
+    """
+    return hashlib.sha1(repr(tuple(column)).encode("utf-8")).digest()
+
+
+def _app_row(column: tuple) -> tuple:
+    """
+    Appends the content_hash to a row built by WritableDB.app_to_column, for inserting it into the apps table.
+
+    The hash is taken before SQLite converts any values, so sync_apps can compare it with rows built from the
+    same apps later.
+    """
+    return column + (column_hash(column),)
+
+
+class SyncReport(NamedTuple):
+    """
+    Counts of the rows changed by a sync.
+
+    Attributes:
+        added (int): Number of rows inserted.
+        updated (int): Number of rows replaced because their contents changed.
+        removed (int): Number of rows deleted.
+    """
+    added: int
+    updated: int
+    removed: int
+
+
+# Layout of the compiled catalog snapshot written by WritableDB.write_snapshot:
+# a header, one fixed size record per app sorted by id, then a table of the UTF-8 strings the records point to
+_SNAPSHOT_MAGIC = b"SADBCAT\0"
+_SNAPSHOT_VERSION = 1
+_SNAPSHOT_HEADER = struct.Struct("<8sIIQQ")  # magic, version, app count, records offset, strings offset
+# Columns of the apps table stored as strings, the other three (pricing, mobile, still_rating) are stored as bytes
+_SNAPSHOT_TEXT_COLUMNS = (0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 15, 16, 17, 18, 19, 20)
+_SNAPSHOT_ENUM_COLUMNS = (12, 13, 14)
+# (offset, length) into the string table for every text column, then the enum columns
+_SNAPSHOT_RECORD = struct.Struct("<" + "II" * len(_SNAPSHOT_TEXT_COLUMNS) + "BBBx")
+_SNAPSHOT_NULL = 0xFFFFFFFF  # length used for NULL strings
+
+
+class CatalogSnapshot:
+    """
+    A read-only, memory-mapped view of the compiled catalog snapshot written next to the database.
+
+    Opening a snapshot only maps the file, apps are decoded when they are accessed, so opening
+    it does not get slower as the catalog grows.
+
+    ...
+
+    Methods
+    -------
+    get_app(app_id: str) -> sadb.App:
+        Returns the app with the given id, found by binary search.
+    get_column(index: int) -> tuple:
+        Returns the app at the given position as a row of the apps table.
+    close() -> None:
+        Unmaps the snapshot.
+    """
+    def __init__(self, path: str):
+        """
+        Maps the snapshot at the given path.
+
+        Parameters:
+            path (str): The location of the snapshot, usually SadbConfig.catalog_location.
+
+        Raises:
+            ValueError: If the file is not a catalog snapshot this version of saDB can read.
+        """
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        magic, version, self._count, self._records, self._strings = _SNAPSHOT_HEADER.unpack_from(self._view, 0)
+        if magic != _SNAPSHOT_MAGIC or version != _SNAPSHOT_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a saDB catalog snapshot")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> sadb.App:
+        return ReadableDB.column_to_app(self.get_column(index))
+
+    def __iter__(self):
+        for index in range(self._count):
+            yield self[index]
+
+    def close(self) -> None:
+        """
+        Unmaps the snapshot. Apps already returned stay usable.
+        """
+        self._view.release()
+        self._mmap.close()
+
+    def _string(self, offset: int, length: int) -> Optional[str]:
+        if length == _SNAPSHOT_NULL:
+            return None
+        start = self._strings + offset
+        return str(self._view[start:start + length], "utf-8")
+
+    def _app_id(self, index: int) -> bytes:
+        # The id is the first text column, compared as bytes since UTF-8 keeps the sort order of the ids
+        offset, length = struct.unpack_from("<II", self._view, self._records + index * _SNAPSHOT_RECORD.size)
+        start = self._strings + offset
+        return self._view[start:start + length].tobytes()
+
+    def get_column(self, index: int) -> tuple:
+        """
+        Returns the app at the given position as a row of the apps table.
+
+        Parameters:
+            index (int): The position of the app, apps are sorted by id.
+
+        Returns:
+            tuple: The row, in the same format as ReadableDB.column_to_app expects.
+        """
+        if not 0 <= index < self._count:
+            raise IndexError("catalog snapshot index out of range")
+        fields = _SNAPSHOT_RECORD.unpack_from(self._view, self._records + index * _SNAPSHOT_RECORD.size)
+        column = [None] * 21
+        for i, column_index in enumerate(_SNAPSHOT_TEXT_COLUMNS):
+            column[column_index] = self._string(fields[i * 2], fields[i * 2 + 1])
+        for i, column_index in enumerate(_SNAPSHOT_ENUM_COLUMNS):
+            column[column_index] = fields[len(_SNAPSHOT_TEXT_COLUMNS) * 2 + i]
+        return tuple(column)
+
+    def get_app(self, app_id: str) -> Optional[sadb.App]:
+        """
+        Returns the app with the given id from the snapshot.
+
+        Parameters:
+            app_id (str): The id of the app.
+
+        Returns:
+            sadb.App: The app with the given id, or None if it isn't in the snapshot.
+        """
+        key = app_id.encode("utf-8")
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._app_id(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._count and self._app_id(low) == key:
+            return self[low]
+        return None
+
+
 def remove_duplicate_apps(apps: List[sadb.App]) -> List[sadb.App]:
     unique_apps = {}
     for app in apps:
@@ -52,6 +515,8 @@ class ReadableDB:
 
     Attributes
     ----------
+    config : SadbConfig
+        the configuration the database was opened with
     conn : sqlite3.Connection
         a SQLite connection object
     c : sqlite3.Cursor
@@ -67,6 +532,24 @@ class ReadableDB:
         Returns all apps from the database.
     get_apps_from_query(query: str) -> list:
         Executes the given SQL query and returns the result as a list of App class instances.
+    search_apps(query: str, limit: int, offset: int) -> list:
+        Returns the apps best matching the given search text.
+    get_apps_by_name(after: sadb.App, limit: int) -> list:
+        Returns the page of apps following the given app, ordered by name.
+    get_apps_by_rating(after: sadb.App, limit: int) -> list:
+        Returns the page of apps following the given app, best rated first.
+    get_apps_in_category(category: str, after: sadb.App, limit: int) -> list:
+        Returns the page of apps in a category following the given app, ordered by name.
+    apps_by_category(category: str) -> list:
+        Returns all apps in the given category.
+    apps_for_mimetype(mimetype: str) -> list:
+        Returns the apps that can open files of the given mimetype.
+    category_counts() -> dict:
+        Returns the number of apps in each category.
+    iter_all_apps(batch_size: int) -> Iterator[sadb.App]:
+        Yields all apps from the database, fetching them in batches.
+    get_imported_files() -> dict:
+        Returns the validators of the repository files the apps were last imported from.
     """
     def __init__(self, config: SadbConfig, init_db: bool = True):
         """
@@ -76,10 +559,9 @@ class ReadableDB:
             config (SadbConfig): The configuration for the database.
             init_db (bool): Whether to initialize the database connection. Default is True.
         """
+        self.config = config
         if init_db:  # used to prevent init of the connection for writable db
-            # Use uri workaround to open in read-only mode
-            file_uri = urlunparse(urlparse(os.path.abspath(config.db_location))._replace(scheme='file')) + "?mode=ro"
-            self.conn = sqlite3.connect(file_uri, uri=True)
+            self.conn = connect(config)
             self.c = self.conn.cursor()
 
     def __enter__(self):
@@ -88,6 +570,33 @@ class ReadableDB:
     def __exit__(self, type, value, traceback):
         self.conn.close()
 
+    def _query(self, row_factory, query: str, parameters: tuple = ()) -> sqlite3.Cursor:
+        """
+        Executes a query on a new cursor that decodes each row with the given row factory.
+
+        Parameters:
+            row_factory: Called by sqlite3 with the cursor and each row of the result.
+            query (str): The SQL query.
+            parameters (tuple): The parameters of the query.
+
+        Returns:
+            sqlite3.Cursor: The cursor, ready to be fetched from.
+        """
+        cursor = self.conn.cursor()
+        cursor.row_factory = row_factory
+        return cursor.execute(query, parameters)
+
+    def _iter_query(self, row_factory, query: str, parameters: tuple = (), batch_size: int = BATCH_SIZE):
+        """
+        Executes a query and yields its decoded rows, fetching batch_size rows at a time.
+        """
+        cursor = self._query(row_factory, query, parameters)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield from rows
+
     def get_app(self, app_id: str) -> Optional[sadb.App]:
         """
         Returns the app with the given id from the database.
@@ -98,11 +607,7 @@ class ReadableDB:
         Returns:
             sadb.App: The app with the given id.
         """
-        self.c.execute("SELECT * FROM apps WHERE id=?", (app_id, ))
-        app = self.c.fetchone()
-        if app is None:
-            return None
-        return self.column_to_app(app)
+        return self._query(_app_row_factory, f"SELECT {_APP_SELECT} FROM apps WHERE id=?", (app_id,)).fetchone()
 
     def get_installed_app_from_main_db(self, source: str, package: str) -> Optional[sadb.App]:
         """
@@ -114,44 +619,93 @@ class ReadableDB:
         Returns:
             sadb.App: The app with the given id.
         """
-        self.c.execute("SELECT * FROM apps WHERE primary_src=? AND src_pkg_name=?", (source, package))
-        app = self.c.fetchone()
+        app = self._query(
+            _app_row_factory, f"SELECT {_APP_SELECT} FROM apps WHERE primary_src=? AND src_pkg_name=?",
+            (source, package)
+        ).fetchone()
         if app is None:
             return None
-        return sadb.InstalledApp.from_app(self.column_to_app(app))
+        return sadb.InstalledApp.from_app(app)
+
+    def get_installed_apps_from_main_db(
+            self, packages: Iterable[Tuple[str, str]], batch_size: int = BATCH_SIZE
+    ) -> Dict[Tuple[str, str], sadb.InstalledApp]:
+        """
+        Looks up many installed packages in the apps table at once.
+
+        Packages are joined against the apps table batch_size at a time, instead of one query per package.
+
+        Parameters:
+            packages (Iterable[Tuple[str, str]]): The (source, package) pairs to look up.
+            batch_size (int): The number of packages looked up per query.
+
+        Returns:
+            Dict[Tuple[str, str], sadb.InstalledApp]: The apps found, keyed by their (source, package) pair.
+                Packages missing from the database are left out.
+        """
+        packages = list(dict.fromkeys(packages))
+        apps = {}
+        for start in range(0, len(packages), batch_size):
+            batch = packages[start:start + batch_size]
+            values = ", ".join("(?, ?)" for _ in batch)
+            cursor = self._query(
+                _app_row_factory,
+                f"""WITH refs(primary_src, src_pkg_name) AS (VALUES {values})
+                SELECT {_APP_SELECT_QUALIFIED} FROM refs JOIN apps
+                ON apps.primary_src = refs.primary_src AND apps.src_pkg_name = refs.src_pkg_name""",
+                tuple(value for package in batch for value in package)
+            )
+            for app in cursor:
+                apps[(app.primary_src, app.src_pkg_name)] = sadb.InstalledApp.from_app(app)
+        return apps
 
     def get_installed_apps(self) -> List[sadb.InstalledApp]:
         """
         Returns:
             List[sadb.InstalledApp]: A list of installed apps from the database.
         """
-        self.c.execute("SELECT * FROM installed")
-        apps = []
-        apps_columns = self.c.fetchall()
+        return self._query(_installed_app_row_factory, f"SELECT {_INSTALLED_SELECT} FROM installed").fetchall()
 
-        for app in apps_columns:
-            apps.append(self.column_to_installed_app(app))
-        return apps
+    def iter_installed_apps(self, batch_size: int = BATCH_SIZE) -> Iterator[sadb.InstalledApp]:
+        """
+        Yields the installed apps from the database without loading them all at once.
 
-    def get_installed_app(self, source, package) -> sadb.App:
-        self.c.execute("SELECT * FROM installed WHERE primary_src=? AND src_pkg_name=?", (source, package))
-        app = self.c.fetchone()
-        if app is None:
-            return None
-        return sadb.InstalledApp.from_app(self.column_to_app(app))
+        Parameters:
+            batch_size (int): The number of rows fetched from the database at a time.
+
+        Returns:
+            Iterator[sadb.InstalledApp]: The installed apps.
+        """
+        return self._iter_query(
+            _installed_app_row_factory, f"SELECT {_INSTALLED_SELECT} FROM installed", batch_size=batch_size
+        )
+
+    def get_installed_app(self, source, package) -> Optional[sadb.InstalledApp]:
+        return self._query(
+            _installed_app_row_factory,
+            f"SELECT {_INSTALLED_SELECT} FROM installed WHERE primary_src=? AND src_pkg_name=?",
+            (source, package)
+        ).fetchone()
+
+    def get_imported_files(self) -> Dict[str, str]:
+        """
+        Returns the validators of the repository files the apps table was last imported from, as recorded by
+        set_imported_files.
+
+        Returns:
+            Dict[str, str]: The validators of each file, keyed by its URL. Empty if nothing was imported into this
+                database.
+        """
+        return dict(self.conn.execute("SELECT url, validators FROM imported_files"))
 
     def get_app_updates(self) -> List[sadb.InstalledApp]:
         """
         Returns:
             List[sadb.InstalledApp]: A list of installed apps from the database.
         """
-        self.c.execute("SELECT * FROM installed WHERE update_available = 1")
-        apps = []
-        apps_columns = self.c.fetchall()
-
-        for app in apps_columns:
-            apps.append(self.column_to_installed_app(app))
-        return apps
+        return self._query(
+            _installed_app_row_factory, f"SELECT {_INSTALLED_SELECT} FROM installed WHERE update_available = 1"
+        ).fetchall()
 
 
     @staticmethod
@@ -166,13 +720,7 @@ class ReadableDB:
             sadb.App: The App class instance.
         """
         assert len(column) == 21
-        return sadb.App(
-            column[0], column[1], column[2], column[3], column[4], column[5],
-            column[6], column[7], fcsl(column[8]), fcsl(column[9]), fcsl(column[10]),
-            column[11], sadb.Pricing(column[12]), sadb.MobileType((column[13])),
-            sadb.StillRating(column[14]), column[15], column[16], column[17], fcsl(column[18]),
-            column[19], fcsl(column[20])
-        )
+        return sadb.App.from_column(column)
 
     @staticmethod
     def column_to_installed_app(column: tuple):
@@ -186,13 +734,7 @@ class ReadableDB:
             sadb.App: The App class instance.
         """
         assert len(column) == 22
-        return sadb.InstalledApp(
-            column[21], column[0], column[1], column[2], column[3], column[4], column[5],
-            column[6], column[7], fcsl(column[8]), fcsl(column[9]), fcsl(column[10]),
-            column[11], sadb.Pricing(column[12]), sadb.MobileType((column[13])),
-            sadb.StillRating(column[14]), column[15], column[16], column[17], fcsl(column[18]),
-            column[19], fcsl(column[20])
-        )
+        return sadb.InstalledApp.from_column(column)
 
     def get_all_apps(self) -> list:
         """
@@ -201,21 +743,193 @@ class ReadableDB:
         Returns:
             list: The list of all apps.
         """
-        self.c.execute("SELECT * FROM apps")
-        return [self.column_to_app(app) for app in self.c.fetchall()]
+        return self._query(_app_row_factory, f"SELECT {_APP_SELECT} FROM apps").fetchall()
 
     def get_apps_from_query(self, query: str) -> list:
         """
         Executes the given SQL query and returns the result as a list of App class instances.
 
         Parameters:
-            query (str): The SQL query.
+            query (str): The SQL query, selecting the columns of the apps table in order.
 
         Returns:
             list: The list of App class instances.
         """
-        self.c.execute(query)
-        return [self.column_to_app(app) for app in self.c.fetchall()]
+        return self._query(_app_row_factory, query).fetchall()
+
+    def iter_all_apps(self, batch_size: int = BATCH_SIZE) -> Iterator[sadb.App]:
+        """
+        Yields all apps from the database without loading them all at once.
+
+        Parameters:
+            batch_size (int): The number of rows fetched from the database at a time.
+
+        Returns:
+            Iterator[sadb.App]: The apps.
+        """
+        return self._iter_query(_app_row_factory, f"SELECT {_APP_SELECT} FROM apps", batch_size=batch_size)
+
+    def iter_apps_from_query(self, query: str, parameters: tuple = (),
+                             batch_size: int = BATCH_SIZE) -> Iterator[sadb.App]:
+        """
+        Executes the given SQL query and yields the result as App class instances, fetching them in batches.
+
+        Parameters:
+            query (str): The SQL query, selecting the columns of the apps table in order.
+            parameters (tuple): The parameters of the query.
+            batch_size (int): The number of rows fetched from the database at a time.
+
+        Returns:
+            Iterator[sadb.App]: The apps.
+        """
+        return self._iter_query(_app_row_factory, query, parameters, batch_size)
+
+    @staticmethod
+    def _after_name(app: sadb.App, table: str = "apps") -> Tuple[str, list]:
+        # SQLite sorts NULL names first, and comparing a row value holding NULL gives NULL, so the apps
+        # after an unnamed app are matched separately
+        if app.name is None:
+            return f"(({table}.name IS NULL AND {table}.id > ?) OR {table}.name IS NOT NULL)", [app.app_id]
+        return f"({table}.name, {table}.id) > (?, ?)", [app.name, app.app_id]
+
+    def _get_page(self, conditions: List[str], parameters: list, order: str, limit: int,
+                  source: str = "apps") -> List[sadb.App]:
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        return self._query(
+            _app_row_factory, f"SELECT {_APP_SELECT_QUALIFIED} FROM {source} {where}ORDER BY {order} LIMIT ?",
+            (*parameters, limit)
+        ).fetchall()
+
+    def get_apps_by_name(self, after: Optional[sadb.App] = None, limit: int = 20) -> List[sadb.App]:
+        """
+        Returns a page of apps ordered by name.
+
+        Pages are found from the last app of the previous page rather than an offset, so every page is read
+        straight from the index.
+
+        Parameters:
+            after (sadb.App): The last app of the previous page, or None for the first page.
+            limit (int): The maximum number of apps in the page. Default is 20.
+
+        Returns:
+            List[sadb.App]: The apps in the page.
+        """
+        conditions, parameters = [], []
+        if after is not None:
+            condition, after_parameters = self._after_name(after)
+            conditions.append(condition)
+            parameters += after_parameters
+        return self._get_page(conditions, parameters, "name, id", limit)
+
+    def get_apps_by_rating(self, after: Optional[sadb.App] = None, limit: int = 20) -> List[sadb.App]:
+        """
+        Returns a page of apps ordered by Still rating, best rated first, then by name.
+
+        Parameters:
+            after (sadb.App): The last app of the previous page, or None for the first page.
+            limit (int): The maximum number of apps in the page. Default is 20.
+
+        Returns:
+            List[sadb.App]: The apps in the page.
+        """
+        conditions, parameters = [], []
+        if after is not None:
+            condition, after_parameters = self._after_name(after)
+            conditions.append(f"(still_rating < ? OR (still_rating = ? AND {condition}))")
+            rating = after.still_rating.value
+            parameters += [rating, rating, *after_parameters]
+        return self._get_page(conditions, parameters, "still_rating DESC, name, id", limit)
+
+    def get_apps_in_category(self, category: str, after: Optional[sadb.App] = None,
+                             limit: int = 20) -> List[sadb.App]:
+        """
+        Returns a page of the apps in the given category, ordered by name.
+
+        Parameters:
+            category (str): The category of the apps.
+            after (sadb.App): The last app of the previous page, or None for the first page.
+            limit (int): The maximum number of apps in the page. Default is 20.
+
+        Returns:
+            List[sadb.App]: The apps in the page.
+        """
+        conditions, parameters = ["app_categories.category = ?"], [category]
+        if after is not None:
+            condition, after_parameters = self._after_name(after)
+            conditions.append(condition)
+            parameters += after_parameters
+        return self._get_page(
+            conditions, parameters, "apps.name, apps.id", limit,
+            "app_categories JOIN apps ON apps.id = app_categories.app_id"
+        )
+
+    def apps_by_category(self, category: str) -> List[sadb.App]:
+        """
+        Returns all apps in the given category, ordered by name.
+
+        Parameters:
+            category (str): The category of the apps.
+
+        Returns:
+            List[sadb.App]: The apps in the category.
+        """
+        return self._query(
+            _app_row_factory,
+            f"""SELECT {_APP_SELECT_QUALIFIED} FROM app_categories JOIN apps ON apps.id = app_categories.app_id
+            WHERE app_categories.category = ? ORDER BY apps.name, apps.id""",
+            (category,)
+        ).fetchall()
+
+    def apps_for_mimetype(self, mimetype: str) -> List[sadb.App]:
+        """
+        Returns the apps that can open files of the given mimetype, best rated first.
+
+        Parameters:
+            mimetype (str): The mimetype, such as text/html.
+
+        Returns:
+            List[sadb.App]: The apps handling the mimetype.
+        """
+        return self._query(
+            _app_row_factory,
+            f"""SELECT {_APP_SELECT_QUALIFIED} FROM app_mimetypes JOIN apps ON apps.id = app_mimetypes.app_id
+            WHERE app_mimetypes.mimetype = ? ORDER BY apps.still_rating DESC, apps.name, apps.id""",
+            (mimetype,)
+        ).fetchall()
+
+    def category_counts(self) -> Dict[str, int]:
+        """
+        Returns the number of apps in each category.
+
+        Returns:
+            Dict[str, int]: The number of apps keyed by category, in alphabetical order.
+        """
+        self.c.execute("SELECT category, count(*) FROM app_categories GROUP BY category ORDER BY category")
+        return dict(self.c.fetchall())
+
+    def search_apps(self, query: str, limit: int = 20, offset: int = 0) -> List[sadb.App]:
+        """
+        Returns the apps best matching the given search text, using the full-text index.
+
+        The name, summary, description and keywords of each app are searched, best matches first.
+
+        Parameters:
+            query (str): The text to search for.
+            limit (int): The maximum number of apps to return. Default is 20.
+            offset (int): The number of matching apps to skip, used for paging. Default is 0.
+
+        Returns:
+            List[sadb.App]: The matching apps.
+        """
+        match = fts_query(query)
+        if not match:
+            return []
+        return self._query(
+            _app_row_factory,
+            f"""SELECT {_APP_SELECT_QUALIFIED} FROM apps_fts JOIN apps ON apps.rowid = apps_fts.rowid
+            WHERE apps_fts MATCH ? ORDER BY apps_fts.rank LIMIT ? OFFSET ?""",
+            (match, limit, offset)
+        ).fetchall()
 
 
 class WritableDB(ReadableDB):
@@ -234,13 +948,25 @@ class WritableDB(ReadableDB):
     Methods
     -------
     create_db():
-        Creates the database if it does not exist.
+        Creates the database if it does not exist, and upgrades it to the current schema version.
+    batch(chunk_size: int) -> WritableDB:
+        Context manager grouping the writes made inside it into a single transaction.
     add_app(app: sadb.App) -> None:
         Adds the given app to the database.
-    add_apps(apps: List[sadb.App]) -> None:
-        Adds the given list of apps to the database.
+    add_apps(apps: Iterable[sadb.App], batch_size: int) -> None:
+        Adds the given apps to the database.
+    sync_apps(apps: Iterable[sadb.App], batch_size: int) -> SyncReport:
+        Makes the apps table match the given apps, only writing the rows that changed.
+    write_snapshot(path: str) -> None:
+        Compiles the apps table into a catalog snapshot that CatalogSnapshot can map.
+    rebuild(apps: Iterable[sadb.App], batch_size: int) -> None:
+        Replaces the apps table with the given apps by building a new database and publishing it in place of this one.
     clear_db() -> None:
         Deletes all apps from the database.
+    sync_installed_apps(apps: Iterable[sadb.InstalledApp]) -> SyncReport:
+        Makes the installed table match the given installed apps, only writing what changed.
+    set_imported_files(files: Dict[str, str]) -> None:
+        Records the validators of the repository files the apps table was imported from.
     """
     def __init__(self, config: SadbConfig):
         """
@@ -256,80 +982,431 @@ class WritableDB(ReadableDB):
             if utilities.is_sudo_root():
                 utilities.fix_perms(os.path.dirname(config.db_location))
 
-        self.conn = sqlite3.connect(config.db_location)
-        self.c = self.conn.cursor()
-        if new_db:
-            self.create_db()
-            if utilities.is_sudo_root():
-                utilities.fix_perms(config.db_location)
+        self.config = config
+        # State of the batch in progress, see batch
+        self._batch_size: Optional[int] = None
+        self._pending_apps: List[sadb.App] = []
+        self._pending_installed: List[sadb.InstalledApp] = []
+        self._seen_pkgs: Dict[str, Set[str]] = {}
+        self._connect()
+        self.create_db()  # Also upgrades existing databases in place
+        if new_db and utilities.is_sudo_root():
+            utilities.fix_perms(config.db_location)
         super().__init__(config, init_db=False)
 
+    def _connect(self) -> None:
+        self.conn = connect(self.config, writable=True)
+        self.c = self.conn.cursor()
+        self._fix_wal_perms()
+
+    def _fix_wal_perms(self) -> None:
+        """
+        Gives the write-ahead log and its index to the user when running as sudo root, as they are shared with
+        readers running as the user. SQLite creates them when the database is first written to or replaced, so
+        this runs after those too.
+        """
+        if utilities.is_sudo_root():
+            for suffix in ("-wal", "-shm"):
+                if os.path.exists(self.config.db_location + suffix):
+                    utilities.fix_perms(self.config.db_location + suffix)
+
     def create_db(self):
         """
-        Creates the database if it does not exist.
-        """
-        self.c.execute('''CREATE TABLE IF NOT EXISTS apps
-            (id text, name text, primary_src text, src_pkg_name text, icon_url text, 
-            author text, summary text, description text, categories text, keywords text, 
-            mimetypes text, license text, pricing int, mobile int, still_rating int, 
-            still_rating_notes text, homepage text, donate_url text, screenshot_urls text, 
-            demo_url text, addons text)''')
-        self.c.execute('''CREATE TABLE IF NOT EXISTS installed
-            (id text, name text, primary_src text, src_pkg_name text, icon_url text, 
-            author text, summary text, description text, categories text, keywords text, 
-            mimetypes text, license text, pricing int, mobile int, still_rating int, 
-            still_rating_notes text, homepage text, donate_url text, screenshot_urls text, 
-            demo_url text, addons text, update_available int)''')
+        Creates the database if it does not exist, and upgrades it to the current schema version.
+        """
+        version = self.c.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        try:
+            self.c.execute("BEGIN")
+            for target in range(version + 1, SCHEMA_VERSION + 1):
+                _MIGRATIONS[target](self.c)
+            # PRAGMA statements can't take parameters, SCHEMA_VERSION is always an int
+            self.c.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+        self._fix_wal_perms()
+
+    @contextlib.contextmanager
+    def batch(self, chunk_size: int = BATCH_SIZE) -> Iterator["WritableDB"]:
+        """
+        Context manager grouping the writes made inside it into a single transaction, committed when it ends and
+        rolled back if it raises.
+
+        Inside a batch, add_app and add_installed_app check for duplicates against the package names read once
+        when first needed, and write the apps chunk_size at a time. Nested batches join the outer one.
+
+        Parameters:
+            chunk_size (int): The number of rows add_app and add_installed_app write per executemany call.
+
+        Returns:
+            Iterator[WritableDB]: This database.
+        """
+        if self._batch_size is not None:
+            yield self
+            return
+        self._batch_size = chunk_size
+        try:
+            yield self
+            self._flush()
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+        finally:
+            self._batch_size = None
+            self._pending_apps = []
+            self._pending_installed = []
+            self._seen_pkgs = {}
+
+    def _flush(self) -> None:
+        """
+        Writes the apps added during a batch that were not written yet.
+        """
+        if self._pending_apps:
+            self._insert_apps(self._pending_apps)
+            self._pending_apps = []
+        if self._pending_installed:
+            self.c.executemany(
+                _INSERT_INSTALLED_APP,
+                [self.app_to_column(app) + (app.update_available,) for app in self._pending_installed]
+            )
+            self._pending_installed = []
+
+    def _start_bulk_write(self) -> None:
+        """
+        Prepares a batch in progress for a method writing many rows itself: the rows added so far are written, and
+        the package names read are dropped as the method changes them.
+        """
+        self._flush()
+        self._seen_pkgs = {}
+
+    def _commit(self) -> None:
+        """
+        Commits the changes, unless a batch is in progress, which commits when it ends.
+        """
+        if self._batch_size is None:
+            self.conn.commit()
+
+    def _check_new_pkg(self, table: str, app: sadb.App) -> None:
+        """
+        Raises a ValueError if the given table already has an app with the package name of the given app.
+        """
+        if self._batch_size is None:
+            self.c.execute(f"SELECT 1 FROM {table} WHERE src_pkg_name=?", (app.src_pkg_name,))
+            if self.c.fetchone() is not None:
+                raise ValueError(f"An app with src_pkg_name {app.src_pkg_name} already exists.")
+            return
+        if table not in self._seen_pkgs:
+            self._seen_pkgs[table] = {row[0] for row in self.conn.execute(f"SELECT src_pkg_name FROM {table}")}
+        if app.src_pkg_name in self._seen_pkgs[table]:
+            raise ValueError(f"An app with src_pkg_name {app.src_pkg_name} already exists.")
+        self._seen_pkgs[table].add(app.src_pkg_name)
 
     def add_app(self, app: sadb.App) -> None:
         """
-        Adds the given app to the database.
+        Adds the given app to the database. Inside a batch, the app is written with the next chunk.
 
         Parameters:
             app (sadb.App): The app to add.
+
+        Raises:
+            ValueError: If an app with the same package name already exists.
         """
         # Prevent apps with the same package name
-        self.c.execute("SELECT * FROM apps WHERE src_pkg_name=?", (app.src_pkg_name,))
-        if self.c.fetchone() is not None:
-            raise ValueError(f"An app with src_pkg_name {app.src_pkg_name} already exists.")
-        self.c.execute("INSERT OR REPLACE INTO apps VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
-            (
-                app.app_id, app.name, app.primary_src, app.src_pkg_name, app.icon_url,
-                app.author, app.summary, app.description, tcsl(app.categories),
-                tcsl(app.keywords), tcsl(app.mimetypes), app.app_license, app.pricing.value,
-                app.mobile.value, app.still_rating.value, app.still_rating_notes, app.homepage,
-                app.donate_url, tcsl(app.screenshot_urls), app.demo_url, tcsl(app.addons)
-            )
-        )
+        self._check_new_pkg("apps", app)
+        if self._batch_size is not None:
+            self._pending_apps.append(app)
+            if len(self._pending_apps) >= self._batch_size:
+                self._flush()
+            return
+        self._insert_apps([app])
         self.conn.commit()
 
-    def add_apps(self, apps: List[sadb.App]) -> None:
+    def add_apps(self, apps: Iterable[sadb.App], batch_size: int = BATCH_SIZE) -> None:
         """
-        Adds the given list of apps to the database.
+        Adds the given apps to the database, skipping package names that are already present.
+
+        Apps are consumed lazily and written in batches, so a generator (such as
+        yaml_parse.iter_apps_from_yaml) is never fully loaded into memory.
 
         Parameters:
-            apps (list): The list of apps to add.
+            apps (Iterable[sadb.App]): The apps to add.
+            batch_size (int): The number of rows written per executemany call.
         """
-        # Removing duplicate package names
+        self._start_bulk_write()
         self.c.execute("SELECT src_pkg_name FROM apps")
-        existing_pkgs = [row[3] for row in self.c.fetchall()]
-        apps = remove_duplicate_apps(apps)
-        apps_data = [
-            (
-                app.app_id, app.name, app.primary_src, app.src_pkg_name, app.icon_url,
-                app.author, app.summary, app.description, tcsl(app.categories),
-                tcsl(app.keywords), tcsl(app.mimetypes), app.app_license, app.pricing.value,
-                app.mobile.value, app.still_rating.value, app.still_rating_notes, app.homepage,
-                app.donate_url, tcsl(app.screenshot_urls), app.demo_url, tcsl(app.addons)
-            ) for app in apps if app.src_pkg_name not in existing_pkgs
-        ]
-        self.c.executemany("INSERT OR REPLACE INTO apps VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)", apps_data)
-        self.conn.commit()
+        seen = {row[0] for row in self.c.fetchall()}
+        batch = []
+        try:
+            for app in apps:
+                # Removing duplicate package names
+                if app.src_pkg_name in seen:
+                    continue
+                seen.add(app.src_pkg_name)
+                batch.append(app)
+                if len(batch) >= batch_size:
+                    self._insert_apps(batch)
+                    batch = []
+            self._insert_apps(batch)
+            self._commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    def sync_apps(self, apps: Iterable[sadb.App], batch_size: int = BATCH_SIZE) -> SyncReport:
+        """
+        Makes the apps table match the given apps, only writing the rows that changed.
+
+        Apps are matched by src_pkg_name and compared by the hash of their row stored when they were
+        written, so unchanged apps are never rewritten. Apps are consumed lazily and written in batches,
+        and all changes are applied in a single transaction.
+
+        Parameters:
+            apps (Iterable[sadb.App]): The apps the table should contain. Later duplicates are ignored.
+            batch_size (int): The number of rows written per executemany call.
+
+        Returns:
+            SyncReport: The number of apps added, updated and removed.
+        """
+        self._start_bulk_write()
+        self.c.execute("SELECT src_pkg_name, content_hash FROM apps")
+        existing = dict(self.c.fetchall())
+
+        seen = set()
+        batch = []
+        columns = []
+        changed_pkgs = []
+        added = 0
+        updated = 0
+        try:
+            for app in apps:
+                if app.src_pkg_name in seen:
+                    continue
+                seen.add(app.src_pkg_name)
+                column = self.app_to_column(app)
+                if app.src_pkg_name not in existing:
+                    added += 1
+                elif existing[app.src_pkg_name] == column_hash(column):
+                    continue
+                else:
+                    changed_pkgs.append((app.src_pkg_name,))
+                    updated += 1
+                batch.append(app)
+                columns.append(column)
+                if len(batch) >= batch_size:
+                    self.c.executemany("DELETE FROM apps WHERE src_pkg_name=?", changed_pkgs)
+                    self._insert_apps(batch, columns)
+                    batch = []
+                    columns = []
+                    changed_pkgs = []
+            removed_pkgs = [(pkg,) for pkg in existing if pkg not in seen]
+            self.c.executemany("DELETE FROM apps WHERE src_pkg_name=?", removed_pkgs + changed_pkgs)
+            self._insert_apps(batch, columns)
+            self._commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return SyncReport(added, updated, len(removed_pkgs))
+
+    def _insert_apps(self, apps: List[sadb.App], columns: Optional[List[tuple]] = None) -> None:
+        """
+        Inserts the given apps and their links, replacing apps with the same id.
+
+        Parameters:
+            apps (List[sadb.App]): The apps to insert.
+            columns (List[tuple]): The rows of the apps, if they were already made by app_to_column.
+        """
+        if columns is None:
+            columns = [self.app_to_column(app) for app in apps]
+        self.c.executemany(_INSERT_APP, [_app_row(column) for column in columns])
+        _insert_links(self.c, apps)
+
+    @staticmethod
+    def app_to_column(app: sadb.App) -> tuple:
+        """
+        Converts an App class instance to a row of the apps table.
+
+        Parameters:
+            app (sadb.App): The app to convert.
+
+        Returns:
+            tuple: The row.
+        """
+        return (
+            app.app_id, app.name, app.primary_src, app.src_pkg_name, app.icon_url,
+            app.author, app.summary, app.description, tcsl(app.categories),
+            tcsl(app.keywords), tcsl(app.mimetypes), app.app_license, app.pricing.value,
+            app.mobile.value, app.still_rating.value, app.still_rating_notes, app.homepage,
+            app.donate_url, tcsl(app.screenshot_urls), app.demo_url, tcsl(app.addons)
+        )
+
+    def write_snapshot(self, path: str) -> None:
+        """
+        Compiles the apps table into a catalog snapshot that CatalogSnapshot can map.
+
+        The snapshot is written to a temporary file and renamed over the old one, so readers
+        never see a partially written snapshot.
+
+        Parameters:
+            path (str): The location of the snapshot, usually SadbConfig.catalog_location.
+        """
+        records = bytearray()
+        strings = bytearray()
+        string_offsets = {}  # Repeated strings such as authors and categories are stored once
+        self.c.execute(f"SELECT {_APP_SELECT} FROM apps WHERE id IS NOT NULL ORDER BY id")
+        count = 0
+        for column in self.c:
+            fields = []
+            for column_index in _SNAPSHOT_TEXT_COLUMNS:
+                value = column[column_index]
+                if value is None:
+                    fields += (0, _SNAPSHOT_NULL)
+                    continue
+                encoded = str(value).encode("utf-8")
+                offset = string_offsets.get(encoded)
+                if offset is None:
+                    offset = string_offsets[encoded] = len(strings)
+                    strings += encoded
+                fields += (offset, len(encoded))
+            fields += (column[index] or 0 for index in _SNAPSHOT_ENUM_COLUMNS)
+            records += _SNAPSHOT_RECORD.pack(*fields)
+            count += 1
+
+        records_offset = _SNAPSHOT_HEADER.size
+        strings_offset = records_offset + len(records)
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as file:
+            file.write(_SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, _SNAPSHOT_VERSION, count, records_offset, strings_offset))
+            file.write(records)
+            file.write(strings)
+            # The data must be on disk before the rename, or a crash could leave readers a truncated snapshot
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+        _fsync_directory(path)
+        if utilities.is_sudo_root():
+            utilities.fix_perms(path)
+
+    def rebuild(self, apps: Iterable[sadb.App], batch_size: int = BATCH_SIZE) -> None:
+        """
+        Replaces the apps table with the given apps by building a new database next to this one and publishing it
+        in place of this one.
+
+        The new database is loaded without a journal or syncing, and its indexes, triggers and full-text index are
+        created once all apps are loaded. The installed table is copied from this database. The file is then
+        vacuumed and analyzed. With write-ahead logging it is copied into this database in one transaction,
+        otherwise it is synced and renamed over this one. Either way readers keep seeing the complete old catalog
+        until it is replaced by the complete new one. Writes made to this database by other connections during the
+        rebuild are lost.
+
+        Parameters:
+            apps (Iterable[sadb.App]): The apps the table should contain. Apps whose package name or id was already
+                given are skipped.
+            batch_size (int): The number of rows written per executemany call.
+        """
+        if self._batch_size is not None:
+            raise RuntimeError("The database can't be rebuilt while a batch is in progress")
+        path = self.config.db_location
+        shadow_path = path + ".rebuild"
+        if os.path.exists(shadow_path):
+            os.remove(shadow_path)  # Left by a rebuild that was interrupted
+        shadow = sqlite3.connect(shadow_path, isolation_level=None)
+        try:
+            c = shadow.cursor()
+            for pragma in _BULK_LOAD_PRAGMAS:
+                c.execute(f"PRAGMA {pragma}")
+            # Copying pages into a database using write-ahead logging needs the same page size
+            c.execute(f"PRAGMA page_size = {self.conn.execute('PRAGMA page_size').fetchone()[0]}")
+            c.execute("ATTACH DATABASE ? AS live", (path,))  # Not allowed inside a transaction
+            c.execute("BEGIN")
+            for target in range(1, SCHEMA_VERSION + 1):
+                _MIGRATIONS[target](c)
+            c.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+            # Indexes and triggers are dropped while loading and created again afterwards, which is much faster
+            c.execute("SELECT type, name, sql FROM sqlite_master "
+                      "WHERE type IN ('index', 'trigger') AND sql IS NOT NULL ORDER BY rowid")
+            deferred = c.fetchall()
+            for kind, name, _ in deferred:
+                c.execute(f"DROP {kind} {name}")
+
+            seen_pkgs = set()
+            seen_ids = set()
+            batch = []
+
+            def flush():
+                c.executemany(_INSERT_APP, [_app_row(self.app_to_column(app)) for app in batch])
+                _insert_links(c, batch)
+                batch.clear()
+
+            for app in apps:
+                if app.src_pkg_name in seen_pkgs or app.app_id in seen_ids:
+                    continue
+                seen_pkgs.add(app.src_pkg_name)
+                seen_ids.add(app.app_id)
+                batch.append(app)
+                if len(batch) >= batch_size:
+                    flush()
+            flush()
+
+            c.execute(f"INSERT INTO installed SELECT {_INSTALLED_SELECT} FROM live.installed")
+            c.execute("COMMIT")
+            c.execute("DETACH DATABASE live")
+
+            c.execute("BEGIN")
+            for _, _, sql in deferred:
+                c.execute(sql)
+            c.execute("INSERT INTO apps_fts(apps_fts) VALUES ('rebuild')")
+            c.execute("COMMIT")
+            c.execute("ANALYZE")
+            c.execute("VACUUM")
+        except BaseException:
+            shadow.close()
+            os.remove(shadow_path)
+            raise
+
+        if self.config.db_wal:
+            # A rename would leave the write-ahead log of the old database next to the new one, so the new database
+            # is copied in through a single write transaction instead. Readers keep their snapshot until it commits.
+            try:
+                shadow.backup(self.conn)
+            finally:
+                shadow.close()
+                os.remove(shadow_path)
+            self._fix_wal_perms()
+            return
+        shadow.close()
+
+        with open(shadow_path, "rb") as file:
+            os.fsync(file.fileno())
+        self.conn.close()
+        os.replace(shadow_path, path)
+        _fsync_directory(path)
+        if utilities.is_sudo_root():
+            utilities.fix_perms(path)
+        self._connect()
+
+    def set_imported_files(self, files: Dict[str, str]) -> None:
+        """
+        Records the validators of the repository files the apps table was imported from, replacing the previous
+        record, so the next import can be skipped if the files did not change.
+
+        Parameters:
+            files (Dict[str, str]): The validators of each file, keyed by its URL.
+        """
+        self._start_bulk_write()
+        self.c.execute("DELETE FROM imported_files")
+        self.c.executemany("INSERT INTO imported_files VALUES (?, ?)", files.items())
+        self._commit()
 
     def clear_db(self) -> None:
         """
         Deletes all apps from the database.
         """
+        self._start_bulk_write()
         self.c.execute("DELETE FROM apps")
         #  self.conn.commit()  REMOVE COMMIT INCASE FUTURE OPERATION IS UNSUCCESSFUL
 
@@ -337,43 +1414,40 @@ class WritableDB(ReadableDB):
         """
         Clears the installed app daatbaase
         """
+        self._start_bulk_write()
         self.c.execute("DELETE FROM installed")
         #  self.conn.commit()  REMOVE COMMIT INCASE FUTURE OPERATION IS UNSUCCESSFUL
 
     def add_installed_app(self, app: sadb.InstalledApp):
         """
-        Add app to the installed database
-        """
-        """
-        Adds the given list of apps to the database.
+        Adds the given app to the installed database. Inside a batch, the app is written with the next chunk.
 
         Parameters:
-            apps (list): The list of apps to add.
+            app (sadb.InstalledApp): The app to add.
+
+        Raises:
+            ValueError: If an installed app with the same package name already exists.
         """
         # Prevent apps with the same package name
-        self.c.execute("SELECT * FROM installed WHERE src_pkg_name=?", (app.src_pkg_name,))
-        if self.c.fetchone() is not None:
-            raise ValueError(f"An app with src_pkg_name {app.src_pkg_name} already exists.")
-        self.c.execute("INSERT OR REPLACE INTO installed VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
-            (
-                app.app_id, app.name, app.primary_src, app.src_pkg_name, app.icon_url,
-                app.author, app.summary, app.description, tcsl(app.categories),
-                tcsl(app.keywords), tcsl(app.mimetypes), app.app_license, app.pricing.value,
-                app.mobile.value, app.still_rating.value, app.still_rating_notes, app.homepage,
-                app.donate_url, tcsl(app.screenshot_urls), app.demo_url, tcsl(app.addons), app.update_available
-            )
-        )
+        self._check_new_pkg("installed", app)
+        if self._batch_size is not None:
+            self._pending_installed.append(app)
+            if len(self._pending_installed) >= self._batch_size:
+                self._flush()
+            return
+        self.c.execute(_INSERT_INSTALLED_APP, self.app_to_column(app) + (app.update_available,))
         self.conn.commit()
 
     def add_installed_apps(self, apps: List[sadb.InstalledApp]):
         """
-        Add app to the installed database.
+        Adds the given list of apps to the installed database, skipping package names that are already present.
 
         Parameters:
-            app (sadb.InstalledApp): The app to add.
+            apps (List[sadb.InstalledApp]): The apps to add.
         """
+        self._start_bulk_write()
         self.c.execute("SELECT src_pkg_name FROM installed")
-        existing_pkgs = [row[3] for row in self.c.fetchall()]
+        existing_pkgs = {row[0] for row in self.c.fetchall()}
         apps = remove_duplicate_apps(apps)
         apps_data = [
             (
@@ -384,9 +1458,65 @@ class WritableDB(ReadableDB):
                 app.donate_url, tcsl(app.screenshot_urls), app.demo_url, tcsl(app.addons), app.update_available
             ) for app in apps if app.src_pkg_name not in existing_pkgs
         ]
-        self.c.executemany("INSERT OR REPLACE INTO installed VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)", apps_data)
-        self.conn.commit()
+        self.c.executemany(_INSERT_INSTALLED_APP, apps_data)
+        self._commit()
+
+    def sync_installed_apps(self, apps: Iterable[sadb.InstalledApp],
+                            scope: Optional[Callable[[str], bool]] = None) -> SyncReport:
+        """
+        Makes the installed table match the given installed apps, only writing what changed.
+
+        Apps are matched by source and package name. New and changed apps are upserted, apps that are no longer
+        installed are deleted, and apps whose only change is update_available just get that flag set. All changes
+        are applied in a single transaction.
+
+        Parameters:
+            apps (Iterable[sadb.InstalledApp]): All currently installed apps. Later duplicates are ignored.
+            scope (Optional[Callable[[str], bool]]): Limits the sync to the packages for which it returns True,
+                given their src_pkg_name. Other installed apps are left as they are. Default is every package.
+
+        Returns:
+            SyncReport: The number of apps added, updated and removed.
+        """
+        self._start_bulk_write()
+        self.c.execute("SELECT * FROM installed")
+        existing = {
+            (column[2], column[3]): (column_hash(column[:21]), column[21])
+            for column in self.c.fetchall() if scope is None or scope(column[3])
+        }
+
+        seen = set()
+        upserts = []
+        flags = []
+        added = 0
+        for app in apps:
+            key = (app.primary_src, app.src_pkg_name)
+            if key in seen or (scope is not None and not scope(app.src_pkg_name)):
+                continue
+            seen.add(key)
+            column = self.app_to_column(app)
+            update_available = int(bool(app.update_available))
+            old = existing.get(key)
+            if old is None:
+                added += 1
+                upserts.append(column + (update_available,))
+            elif old[0] != column_hash(column):
+                upserts.append(column + (update_available,))
+            elif old[1] != update_available:
+                flags.append((update_available,) + key)
+        removed = [key for key in existing if key not in seen]
+
+        # Committed at once, or with the rest of the batch this sync is part of
+        with self.batch():
+            self.c.executemany("DELETE FROM installed WHERE primary_src=? AND src_pkg_name=?", removed)
+            self.c.executemany(_INSERT_INSTALLED_APP, upserts)
+            self.c.executemany("UPDATE installed SET update_available=? WHERE primary_src=? AND src_pkg_name=?", flags)
+        return SyncReport(added, len(upserts) - added + len(flags), len(removed))
 
 
 def get_readable_db() -> ReadableDB:
     return ReadableDB(SadbConfig())
+
+
+def get_catalog_snapshot() -> "CatalogSnapshot":
+    return CatalogSnapshot(SadbConfig().catalog_location)
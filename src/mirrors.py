@@ -0,0 +1,124 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, NamedTuple, Optional
+
+import requests
+
+import sadb.utilities as utilities
+
+# Bytes downloaded from each mirror to measure its throughput
+PROBE_SIZE = 256 * 1024
+# Seconds a probe may take before the mirror counts as down
+PROBE_TIMEOUT = 10
+# Maximum number of mirrors probed at the same time
+MAX_PARALLEL_PROBES = 8
+# Size of the download mirrors are ranked for, weighing latency against throughput
+RANKING_SIZE = 4 * 1024 * 1024
+
+
+class MirrorScore(NamedTuple):
+    url: str
+    latency: Optional[float]  # Seconds until the response started, None if the mirror failed
+    throughput: Optional[float]  # Bytes per second, None if the mirror failed
+
+    @property
+    def estimate(self) -> float:
+        """
+        The estimated number of seconds to download RANKING_SIZE bytes, infinite for failed mirrors.
+        """
+        if self.latency is None or not self.throughput:
+            return float("inf")
+        return self.latency + RANKING_SIZE / self.throughput
+
+
+def probe(session: requests.Session, url: str) -> MirrorScore:
+    """
+    Measures the latency and throughput of a mirror by downloading the start of a file from it.
+
+    Args:
+        session (requests.Session): The session to download with.
+        url (str): The URL of the file on the mirror.
+
+    Returns:
+        MirrorScore: The measurements, without latency and throughput if the mirror failed.
+    """
+    start = time.perf_counter()
+    try:
+        with session.get(
+            url, headers={"Range": f"bytes=0-{PROBE_SIZE - 1}", "Accept-Encoding": "identity"},
+            stream=True, timeout=PROBE_TIMEOUT
+        ) as response:
+            latency = time.perf_counter() - start
+            if response.status_code not in (200, 206):
+                return MirrorScore(url, None, None)
+            received = 0
+            # Servers ignoring the range send the whole file, only the start of it is read
+            for data in response.iter_content(64 * 1024):
+                received += len(data)
+                if received >= PROBE_SIZE or time.perf_counter() - start > PROBE_TIMEOUT:
+                    break
+            elapsed = time.perf_counter() - start - latency
+    except requests.RequestException:
+        return MirrorScore(url, None, None)
+    return MirrorScore(url, latency, received / max(elapsed, 1e-6))
+
+
+def probe_mirrors(urls: List[str]) -> List[MirrorScore]:
+    """
+    Probes the given mirrors at the same time.
+
+    Args:
+        urls (List[str]): The URLs of the same file on each mirror.
+
+    Returns:
+        List[MirrorScore]: The measurements of each mirror, fastest first. Failed mirrors come last, in the order
+            they were given.
+    """
+    with requests.Session() as session, \
+            ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_PROBES, len(urls))) as executor:
+        scores = list(executor.map(lambda url: probe(session, url), urls))
+    return sorted(scores, key=lambda score: score.estimate)
+
+
+def rank_mirrors(urls: List[str], cache_path: str, ttl: int, force: bool = False) -> List[str]:
+    """
+    Ranks the given mirrors from fastest to slowest, reusing the last ranking while it is recent.
+
+    The ranking is cached as JSON, and only reused for the same mirrors. With a single mirror nothing is probed.
+
+    Args:
+        urls (List[str]): The URLs of the same file on each mirror, preferred first.
+        cache_path (str): The location of the cached ranking.
+        ttl (int): The number of seconds a ranking is reused for.
+        force (bool): Whether to probe the mirrors even if the cached ranking is recent.
+
+    Returns:
+        List[str]: The URLs, fastest first.
+    """
+    if len(urls) < 2:
+        return list(urls)
+    try:
+        with open(cache_path) as file:
+            cached = json.load(file)
+    except (OSError, ValueError):
+        cached = {}
+    if not force and sorted(cached.get("urls", [])) == sorted(urls) and \
+            time.time() - cached.get("time", 0) < ttl:
+        return cached["ranking"]
+
+    scores = probe_mirrors(urls)
+    ranking = [score.url for score in scores]
+    new_cache = not os.path.exists(cache_path)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    with open(cache_path, "w") as file:
+        json.dump({
+            "urls": urls,
+            "time": time.time(),
+            "ranking": ranking,
+            "scores": [score._asdict() for score in scores]
+        }, file)
+    if new_cache and utilities.is_sudo_root():
+        utilities.fix_perms(cache_path)
+    return ranking
@@ -1,5 +1,32 @@
 from abc import ABC, abstractmethod
-from sadb.database import WritableDB
+from typing import Dict, List, Set
+
+from sadb import InstalledApp
+from sadb.configuration import SadbConfig
+from sadb.database import ReadableDB, SyncReport, WritableDB
+import sadb.yaml_parse as yaml_parse
+
+
+class SourceConfig(dict):
+    """
+    Parsed source configuration (sourceconf.yaml), mapping each source name to its settings.
+
+    Parsing the YAML once and handing the settings of each source to SourceType.from_spec
+    avoids re-parsing the whole file for every source.
+    """
+
+    @classmethod
+    def from_yaml(cls, yml: str) -> "SourceConfig":
+        """
+        Parse a source configuration from YAML.
+
+        Args:
+            yml (str): The YAML configuration for the sources.
+
+        Returns:
+            SourceConfig: The parsed configuration.
+        """
+        return cls(yaml_parse.safe_load(yml) or {})
 
 class SourceType(ABC):
     """
@@ -14,13 +41,39 @@ class SourceType(ABC):
     title: str
     config_folder: str
 
-    @abstractmethod
     def __init__(self, yml: str, source_name: str):
         """
-        Abstract method for initializing a source type.
+        Initialize a source type from the YAML configuration of all sources.
+
+        Args:
+            yml (str): The YAML configuration for the sources.
+            source_name (str): The name of the source.
+        """
+        self.load_spec(SourceConfig.from_yaml(yml)[source_name], source_name)
+
+    @classmethod
+    def from_spec(cls, spec: dict, source_name: str) -> "SourceType":
+        """
+        Create a source type from its already parsed settings.
 
         Args:
-            yml (str): The YAML configuration for the source.
+            spec (dict): The settings of the source, as found in a SourceConfig.
+            source_name (str): The name of the source.
+
+        Returns:
+            SourceType: The source type.
+        """
+        source = cls.__new__(cls)
+        source.load_spec(spec, source_name)
+        return source
+
+    @abstractmethod
+    def load_spec(self, spec: dict, source_name: str):
+        """
+        Abstract method for loading the settings of a source.
+
+        Args:
+            spec (dict): The settings of the source, as found in a SourceConfig.
             source_name (str): The name of the source.
         """
         pass
@@ -54,12 +107,69 @@ class SourceType(ABC):
 
     @staticmethod
     @abstractmethod
-    def add_installed_to_db(db: WritableDB):
+    def add_installed_to_db(db: WritableDB, online: bool = False):
         """
         Method to add installed apps to database
         Args:
             db (WritableDB): database to add apps to
+            online (bool): Whether to ask the remotes for updates instead of using their cached metadata.
+        """
+
+    @staticmethod
+    def get_installed(db: ReadableDB, online: bool = False) -> List[InstalledApp]:
+        """
+        Method to list the apps installed from the source. Sources that can't list their installed apps return none.
+
+        Args:
+            db (ReadableDB): database the installed apps are looked up in
+            online (bool): Whether to ask the remotes for updates instead of using their cached metadata.
+
+        Returns:
+            List[InstalledApp]: The installed apps.
+        """
+        return []
+
+    @staticmethod
+    def watch_paths() -> List[str]:
+        """
+        Method to get the directories that change when apps of the source are installed, updated or removed, which
+        the watch_installed command watches. Sources with nothing to watch return none.
+
+        Returns:
+            List[str]: The directories.
+        """
+        return []
+
+    @staticmethod
+    def sync_changes(db: WritableDB, changes: Dict[str, Set[str]], online: bool = False) -> SyncReport:
+        """
+        Method to bring the installed apps of the source up to date after changes to its watch_paths.
+
+        Args:
+            db (WritableDB): database holding the installed apps
+            changes (Dict[str, Set[str]]): The names of the entries that changed in each watched directory, as
+                yielded by watcher.watch.
+            online (bool): Whether to ask the remotes for updates instead of using their cached metadata.
+
+        Returns:
+            SyncReport: The number of installed apps added, updated and removed.
+        """
+        return SyncReport(0, 0, 0)
+
+    @staticmethod
+    def refresh_remotes(config: SadbConfig, force: bool = False) -> List[str]:
+        """
+        Method to refresh the locally cached metadata of the source's remotes, which is used to detect updates
+        without going online. Sources that keep no such metadata have nothing to refresh.
+
+        Args:
+            config (SadbConfig): The configuration, giving the cache location and how long metadata stays fresh.
+            force (bool): Whether to refresh metadata that is still fresh.
+
+        Returns:
+            List[str]: The names of the remotes that were refreshed.
         """
+        return []
 
 
 class SourceError(Exception):
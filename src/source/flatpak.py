@@ -1,14 +1,16 @@
-import gzip
 import io
 import os
-from typing import Optional, List
+import re
+import time
+from typing import Dict, Optional, List, Set
 import configparser
-import yaml
 
 from sadb import InstalledApp, App
-from sadb.database import WritableDB, ReadableDB
+from sadb.appdata import extract_components
+from sadb.cache import DiskCache
+from sadb.configuration import SadbConfig
+from sadb.database import SyncReport, WritableDB, ReadableDB
 from sadb.source import SourceType
-from xml.etree import ElementTree as etree
 
 import gi
 
@@ -16,6 +18,7 @@ gi.require_version("Flatpak", "1.0")
 gi.require_version("AppStream", "1.0")
 from gi.repository import Flatpak, AppStream, GLib
 
+
 class FlatpakType(SourceType):
     """
     Class for handling Flatpak source type.
@@ -39,24 +42,22 @@ class FlatpakType(SourceType):
     gpg: Optional[str] = None
     alt_urls: Optional[List[str]] = None
 
-    def __init__(self, yml: str, source_name: str):
+    def load_spec(self, spec: dict, source_name: str):
         """
-        Initialize a Flatpak source type.
+        Load the settings of a Flatpak source type.
 
         Args:
-            yml (str): The YAML configuration for the source.
+            spec (dict): The settings of the source, as found in a SourceConfig.
             source_name (str): The name of the source.
         """
-        data = yaml.safe_load(yml)
-        data = data[source_name]
         self.title = source_name
-        self.repo_url = data["repo_url"]
-        self.homepage = data.get("homepage", None)
-        self.description = data.get("description", None)
-        self.comment = data.get("comment", None)
-        self.icon_url = data.get("icon_url", None)
-        self.gpg = data.get("gpg", None)
-        self.alt_urls = data.get("alt_urls", None)
+        self.repo_url = spec["repo_url"]
+        self.homepage = spec.get("homepage", None)
+        self.description = spec.get("description", None)
+        self.comment = spec.get("comment", None)
+        self.icon_url = spec.get("icon_url", None)
+        self.gpg = spec.get("gpg", None)
+        self.alt_urls = spec.get("alt_urls", None)
 
     def generate_config(self) -> str:
         """
@@ -125,94 +126,325 @@ class FlatpakType(SourceType):
         return True, None
 
     @staticmethod
-    def add_installed_to_db(db: WritableDB):
+    def add_installed_to_db(db: WritableDB, online: bool = False):
         """
         Method to add installed apps to database
         Args:
             db (WritableDB): database to add apps to
+            online (bool): Whether to ask the remotes for updates instead of using their cached metadata.
         """
-        db.add_installed_apps(FlatpakType.get_installed(db))
+        db.add_installed_apps(FlatpakType.get_installed(db, online))
 
         # Check for app in sadb (return it)
         # check if remote is a sadb source
         # Get app from app stream
 
     @staticmethod
-    def get_installed(db: ReadableDB) -> List[InstalledApp]:
-        apps = []
-        flatpak_installation = Flatpak.Installation.new_system()
-        refs = flatpak_installation.list_installed_refs()
-        updates_available = [ref.format_ref() for ref in flatpak_installation.list_installed_refs_for_update(None)]
-
-        for ref in refs:
-            origin = ref.get_origin()
-            package = ref.format_ref()
-            update_available = package in updates_available
+    def refresh_remotes(config: SadbConfig, force: bool = False) -> List[str]:
+        """
+        Refresh the cached summaries of the enabled Flatpak remotes that are older than config.remote_ttl.
 
-            if package.split("/")[0] != "app":
-                continue
+        libflatpak only downloads a summary again if it changed on the server, and keeps it for the offline update
+        check in get_installed. A remote that can't be reached keeps its old summary.
 
-            app = db.get_installed_app_from_main_db(origin, package)
+        Args:
+            config (SadbConfig): The configuration, giving the cache location and remote_ttl.
+            force (bool): Whether to refresh summaries that are still fresh.
 
-            if app is None:
+        Returns:
+            List[str]: The names of the remotes that were refreshed.
+        """
+        flatpak_installation = Flatpak.Installation.new_system()
+        refreshed = []
+        with DiskCache(config.cache_location, config.cache_size) as cache:
+            for remote in flatpak_installation.list_remotes():
+                if remote.get_disabled():
+                    continue
+                name = remote.get_name()
+                # The time of the last refresh, forgotten if the remote is pointed to another URL
+                refreshed_at = cache.get(f"flatpak-remote/{name}", remote.get_url())
+                if not force and refreshed_at is not None and time.time() - refreshed_at < config.remote_ttl:
+                    continue
                 try:
-                    appstream_gz = ref.load_appdata(None).get_data()
-                    metadata = AppStream.Metadata()
-                    metadata.set_locale("en")
-                    metadata.parse_bytes(GLib.Bytes(get_component(gzip.decompress(appstream_gz))), AppStream.FormatKind.XML)
-                    app_component = metadata.get_component()
+                    flatpak_installation.list_remote_refs_sync_full(name, Flatpak.QueryFlags.NONE, None)
                 except GLib.GError:
-                    app_component = None
-
-                if app_component is None:
-                    app = InstalledApp(
-                        update_available, f"{origin}-{package.split("/")[1].replace(".", "-")}",
-                        ref.get_name(), origin, package, "", "Unknown Author", ref.get_name(),
-                        "This is an unknown app", ["Unknown"], None, None, None,
-                        None, None, None, None, None, None, None,
-                        None, None
-                    )
                     continue
+                cache.set(f"flatpak-remote/{name}", remote.get_url(), time.time())
+                refreshed.append(name)
+        return refreshed
+
+    @staticmethod
+    def watch_paths() -> List[str]:
+        """
+        Get the directories that change when Flatpak apps are installed, updated or removed: the system installation,
+        where libflatpak touches .changed after every change, and its app directory with a folder per app. The app
+        directory only exists once an app was installed, watcher.watch picks it up when it appears.
+
+        Returns:
+            List[str]: The directories.
+        """
+        installation_path = Flatpak.Installation.new_system().get_path().get_path()
+        return [installation_path, os.path.join(installation_path, "app")]
+
+    @staticmethod
+    def sync_changes(db: WritableDB, changes: Dict[str, Set[str]], online: bool = False) -> SyncReport:
+        """
+        Bring the installed Flatpak apps up to date after changes to the installation.
 
-                icon_path = os.path.join(
-                    flatpak_installation.get_path().get_path(), "app", package.split("/")[1], "current", "active",
-                    "files", "share", "app-info", "icons", "flatpak", "64x64"
-                )
-                if os.path.exists(os.path.join(icon_path, f"{package.split("/")[1]}.png")):
-                    icon = os.path.join(icon_path, f"{package.split("/")[1]}.png")  # Should be local since app is already installed
-                elif os.path.exists(os.path.join(icon_path, f"{package.split("/")[1]}.desktop.png")):
-                    icon = os.path.join(icon_path, f"{package.split("/")[1]}.desktop.png")
-                else:
-                    icon = None
-                mimetypes = app_component.get_provided_for_kind(AppStream.ProvidedKind.MEDIATYPE)
-
-                if mimetypes is None:
-                    mimetypes = []
-                else:
-                    mimetypes = mimetypes.get_items()
-
-                app = InstalledApp(
-                    update_available, f"{origin}-{package.split("/")[1].replace(".", "-")}",
-                    app_component.get_name(), origin, package, icon, app_component.get_developer().get_name(),
-                    app_component.get_summary(), app_component.get_description(), app_component.get_categories(),
-                    app_component.get_keywords(), mimetypes, None, None, None, None,
-                    None, None, None, None, None, None
-                )
+        When folders of the app directory were added or removed only those apps are looked at, otherwise (such as
+        after an update, which only touches .changed) every installed app is.
+
+        Args:
+            db (WritableDB): database holding the installed apps
+            changes (Dict[str, Set[str]]): The names of the entries that changed in each of the watch_paths.
+            online (bool): Whether to ask the remotes for updates instead of using their cached metadata.
+
+        Returns:
+            SyncReport: The number of installed apps added, updated and removed.
+        """
+        names = changes.get(FlatpakType.watch_paths()[1]) or None
+
+        def in_scope(package: str) -> bool:
+            parts = package.split("/")
+            return len(parts) == 4 and parts[0] == "app" and (names is None or parts[1] in names)
+
+        return db.sync_installed_apps(FlatpakType.get_installed(db, online, names), scope=in_scope)
+
+    @staticmethod
+    def get_installed(db: ReadableDB, online: bool = False,
+                      names: Optional[Set[str]] = None) -> List[InstalledApp]:
+        flatpak_installation = Flatpak.Installation.new_system()
+        refs = flatpak_installation.list_installed_refs()
+        refs = [ref for ref in refs if ref.format_ref().split("/")[0] == "app"]
+        if names is not None:
+            refs = [ref for ref in refs if ref.get_name() in names]
+        if online:
+            updates_available = {
+                ref.format_ref() for ref in flatpak_installation.list_installed_refs_for_update(None)
+            }
+        else:
+            updates_available = get_cached_updates(flatpak_installation, refs)
+        # Look up every installed app in the main database with a single batched query
+        known_apps = db.get_installed_apps_from_main_db((ref.get_origin(), ref.format_ref()) for ref in refs)
+
+        apps = [known_apps.get((ref.get_origin(), ref.format_ref())) for ref in refs]
+        unknown_refs = [ref for ref, app in zip(refs, apps) if app is None]
+        # Apps missing from the database are described from their own appdata, cached per deployed commit
+        with DiskCache(db.config.cache_location, db.config.cache_size) as cache:
+            app_fields = iter(FlatpakType._get_app_fields(flatpak_installation, unknown_refs, cache))
+
+        for index, ref in enumerate(refs):
+            update_available = ref.format_ref() in updates_available
+            if apps[index] is None:
+                apps[index] = FlatpakType._app_from_fields(ref, next(app_fields), update_available)
             else:
-                app.update_available = update_available
-            apps.append(app)
+                apps[index].update_available = update_available
         return apps
 
+    @staticmethod
+    def _get_app_fields(flatpak_installation, refs: list, cache: DiskCache) -> List[dict]:
+        """
+        Returns the fields describing each of the given installed refs, from the cache when their deployed commit
+        was seen before and from their appdata otherwise. Refs whose appdata could not be loaded get placeholder
+        fields, which are not cached so the appdata is tried again next time.
+
+        Args:
+            flatpak_installation (Flatpak.Installation): The installation the refs are deployed in.
+            refs (List[Flatpak.InstalledRef]): The installed refs.
+            cache (DiskCache): The cache of fields, keyed by ref and versioned by deployed commit.
+
+        Returns:
+            List[dict]: The fields of each ref, in the same order as the refs.
+        """
+        app_fields = [cache.get(ref.format_ref(), ref.get_commit()) for ref in refs]
+        missing = [index for index, fields in enumerate(app_fields) if fields is None]
+        components = load_components([refs[index] for index in missing])
+        for index, app_component in zip(missing, components):
+            ref = refs[index]
+            app_fields[index] = FlatpakType._fields_from_component(flatpak_installation, ref, app_component)
+            if app_component is not None:
+                cache.set(ref.format_ref(), ref.get_commit(), app_fields[index])
+        return app_fields
 
-def get_component(input_xml: bytes, language: str = "en") -> Optional[bytes]:
-    components = etree.fromstring(input_xml)
-    component = components.find("component")
+    @staticmethod
+    def _fields_from_component(flatpak_installation, ref, app_component) -> dict:
+        """
+        Extracts the fields describing an installed ref from its AppStream component, and finds its icon.
 
-    lang_tag = "{http://www.w3.org/XML/1998/namespace}lang"
+        Args:
+            flatpak_installation (Flatpak.Installation): The installation the ref is deployed in.
+            ref (Flatpak.InstalledRef): The installed ref.
+            app_component (Optional[AppStream.Component]): The component of the ref, None if it has no usable
+                appdata.
+
+        Returns:
+            dict: The fields, as passed to _app_from_fields.
+        """
+        if app_component is None:
+            return {
+                "name": ref.get_name(), "icon_url": "", "author": "Unknown Author", "summary": ref.get_name(),
+                "description": "This is an unknown app", "categories": ["Unknown"], "keywords": None,
+                "mimetypes": None
+            }
+
+        package = ref.format_ref()
+        icon_path = os.path.join(
+            flatpak_installation.get_path().get_path(), "app", package.split("/")[1], "current", "active",
+            "files", "share", "app-info", "icons", "flatpak", "64x64"
+        )
+        if os.path.exists(os.path.join(icon_path, f"{package.split("/")[1]}.png")):
+            icon = os.path.join(icon_path, f"{package.split("/")[1]}.png")  # Should be local since app is already installed
+        elif os.path.exists(os.path.join(icon_path, f"{package.split("/")[1]}.desktop.png")):
+            icon = os.path.join(icon_path, f"{package.split("/")[1]}.desktop.png")
+        else:
+            icon = None
+        mimetypes = app_component.get_provided_for_kind(AppStream.ProvidedKind.MEDIATYPE)
+
+        if mimetypes is None:
+            mimetypes = []
+        else:
+            mimetypes = list(mimetypes.get_items())
+
+        return {
+            "name": app_component.get_name(), "icon_url": icon, "author": app_component.get_developer().get_name(),
+            "summary": app_component.get_summary(), "description": app_component.get_description(),
+            "categories": list(app_component.get_categories()), "keywords": list(app_component.get_keywords()),
+            "mimetypes": mimetypes
+        }
+
+    @staticmethod
+    def _app_from_fields(ref, fields: dict, update_available: bool) -> InstalledApp:
+        """
+        Builds an installed app that is not in the database from the fields describing it.
+
+        Args:
+            ref (Flatpak.InstalledRef): The installed ref.
+            fields (dict): The fields from _fields_from_component.
+            update_available (bool): Whether an update is available for the ref.
+
+        Returns:
+            InstalledApp: The installed app.
+        """
+        origin = ref.get_origin()
+        package = ref.format_ref()
+        return InstalledApp(
+            update_available, f"{origin}-{package.split("/")[1].replace(".", "-")}",
+            fields["name"], origin, package, fields["icon_url"], fields["author"],
+            fields["summary"], fields["description"], fields["categories"],
+            fields["keywords"], fields["mimetypes"], None, None, None, None,
+            None, None, None, None, None, None
+        )
+
+
+def get_cached_updates(flatpak_installation, refs: list) -> Set[str]:
+    """
+    Find the installed refs with an update, by comparing their deployed commit with the commit in the cached summary
+    of their remote. Nothing is downloaded, so remotes whose summary was never cached report no updates.
+
+    A ref deployed after its remote's summary was cached (updated online since the last refresh_remotes) is newer
+    than what the summary lists, so it is not reported. Neither is one whose summary can't be dated, as it can't be
+    told apart from that case.
+
+    Args:
+        flatpak_installation (Flatpak.Installation): The installation the refs are deployed in.
+        refs (List[Flatpak.InstalledRef]): The installed refs.
+
+    Returns:
+        Set[str]: The refs with an update, formatted as by format_ref.
+    """
+    summary_dir = os.path.join(flatpak_installation.get_path().get_path(), "repo", "tmp", "cache", "summaries")
+    remote_commits = {}
+    cached_at = {}
+    for origin in {ref.get_origin() for ref in refs}:
+        try:
+            remote_refs = flatpak_installation.list_remote_refs_sync_full(
+                origin, Flatpak.QueryFlags.ONLY_CACHED, None
+            )
+        except GLib.GError:
+            continue
+        remote_commits[origin] = {remote_ref.format_ref(): remote_ref.get_commit() for remote_ref in remote_refs}
+        cached_at[origin] = summary_cached_at(summary_dir, origin)
+
+    updates = set()
+    for ref in refs:
+        commit = remote_commits.get(ref.get_origin(), {}).get(ref.format_ref())
+        if commit is None or commit == ref.get_commit():
+            continue
+        summary_time = cached_at[ref.get_origin()]
+        try:
+            # libflatpak writes the deploy file when it deploys a commit
+            deployed_at = os.path.getmtime(os.path.join(ref.get_deploy_dir(), "deploy"))
+        except (OSError, TypeError):
+            deployed_at = None
+        if summary_time is not None and (deployed_at is None or summary_time > deployed_at):
+            updates.add(ref.format_ref())
+    return updates
+
+
+def summary_cached_at(summary_dir: str, remote: str) -> Optional[float]:
+    """
+    Find when the summary of a remote was last cached by libflatpak.
+
+    Args:
+        summary_dir (str): The summary cache of the installation's repo.
+        remote (str): The name of the remote.
+
+    Returns:
+        Optional[float]: The modification time of the newest cached summary file of the remote, None if there is none.
+    """
+    # Summaries are cached as <remote>, <remote>.idx and <remote>-<checksum>.sub, each possibly with a .sig
+    pattern = re.compile(re.escape(remote) + r"(\.idx|-[0-9a-f]{64}\.sub)?(\.sig)?")
+    times = []
+    try:
+        for entry in os.scandir(summary_dir):
+            if pattern.fullmatch(entry.name):
+                times.append(entry.stat().st_mtime)
+    except OSError:
+        return None
+    return max(times, default=None)
+
+
+def load_components(refs: list) -> List[Optional["AppStream.Component"]]:
+    """
+    Loads the AppStream component of each of the given installed refs.
+
+    Decompressing and trimming the appdata is spread over a process pool once there are at least
+    appdata.PARALLEL_THRESHOLD refs, see appdata.extract_components. A ref whose appdata cannot be loaded or parsed
+    gets None without affecting the others.
+
+    Args:
+        refs (List[Flatpak.InstalledRef]): The installed refs.
+
+    Returns:
+        List[Optional[AppStream.Component]]: The components, in the same order as the refs.
+    """
+    appdata = []
+    for ref in refs:
+        try:
+            appdata.append(ref.load_appdata(None).get_data())
+        except GLib.GError:
+            appdata.append(None)
+
+    return [parse_component(component_xml) for component_xml in extract_components(appdata)]
+
+
+def parse_component(component_xml: Optional[bytes]) -> Optional["AppStream.Component"]:
+    """
+    Parses component XML from extract_component into an AppStream component.
+
+    Args:
+        component_xml (Optional[bytes]): The component XML.
+
+    Returns:
+        Optional[AppStream.Component]: The component, None if the XML could not be parsed.
+    """
+    if component_xml is None:
+        return None
+    try:
+        metadata = AppStream.Metadata()
+        metadata.set_locale("en")
+        metadata.parse_bytes(GLib.Bytes(component_xml), AppStream.FormatKind.XML)
+        return metadata.get_component()
+    except GLib.GError:
+        return None
 
-    if component is not None:
-        for element in list(component):
-            if lang_tag in element.attrib and element.attrib[lang_tag] != language:
-                component.remove(element)
-        return etree.tostring(component, encoding='utf-8')
-    return None
\ No newline at end of file
@@ -1,8 +1,7 @@
 import os.path
-from typing import Optional
+from typing import Optional, Union
 
-import yaml
-from sadb.source import SourceError
+from sadb.source import SourceConfig, SourceError
 from sadb.source.flatpak import FlatpakType
 from sadb.source.snap import SnapType
 
@@ -20,24 +19,24 @@ Attributes:
 """
 
 
-def check_sources(src_yml: str, testing: bool = False) -> (bool, Optional[Exception]):
+def check_sources(src_yml: Union[str, SourceConfig], testing: bool = False) -> (bool, Optional[Exception]):
     """
     Function to check the configurations for all sources.
 
     Args:
-        src_yml (str): The YAML configuration for the sources.
+        src_yml (Union[str, SourceConfig]): The YAML configuration for the sources, or the already parsed configuration.
         testing (bool): Whether the function is being used for testing.
 
     Returns:
         bool: True if all the configurations are valid, False otherwise.
         Optional[Exception]: The exception if any of the configurations is not valid.
     """
-    data = yaml.safe_load(src_yml)
-    for source_name in data:
-        if data[source_name]["source_type"] not in sources:
-            return False, SourceError(source_name, f"Unknown source type: {data[source_name]['type']}")
+    data = src_yml if isinstance(src_yml, SourceConfig) else SourceConfig.from_yaml(src_yml)
+    for source_name, spec in data.items():
+        if spec["source_type"] not in sources:
+            return False, SourceError(source_name, f"Unknown source type: {spec['source_type']}")
         try:
-            source_class = sources[data[source_name]["source_type"]](src_yml, source_name)
+            source_class = sources[spec["source_type"]].from_spec(spec, source_name)
             if testing:
                 if not os.path.exists(f"sources/{source_name}"):
                     os.makedirs(f"sources/{source_name}", exist_ok=True)
@@ -59,12 +58,12 @@ def generate_sources(src_yml: str, testing: bool = False):
         src_yml (str): The YAML configuration for the sources.
         testing (bool): Whether the function is being used for testing.
     """
-    data = yaml.safe_load(src_yml)
-    for source_name in data:
+    data = SourceConfig.from_yaml(src_yml)
+    for source_name, spec in data.items():
         try:
-            source_class = sources[data[source_name]["source_type"]](src_yml, source_name)
+            source_class = sources[spec["source_type"]].from_spec(spec, source_name)
         except KeyError:
-            raise SourceError(source_name, f"Unknown source type: {data[source_name]['source_type']}")
+            raise SourceError(source_name, f"Unknown source type: {spec['source_type']}")
         if testing:
             if not os.path.exists(f"sources/{source_name}"):
                 os.makedirs(f"sources/{source_name}", exist_ok=True)
@@ -73,6 +72,6 @@ def generate_sources(src_yml: str, testing: bool = False):
         if not check_conf[0]:
             source_class.write_config()
 
-    check_conf = check_sources(src_yml)
+    check_conf = check_sources(data)
     if not check_conf[0]:
         raise check_conf[1]
\ No newline at end of file
@@ -1,5 +1,4 @@
 from typing import Optional, List
-import yaml
 
 from sadb.source import SourceType
 
@@ -19,20 +18,18 @@ class SnapType(SourceType):
     title = "Snap Store"
     config_folder = ""
 
-    def __init__(self, yml: str, source_name: str):
+    def load_spec(self, spec: dict, source_name: str):
         """
-        Initialize a Snap source type.
+        Load the settings of a Snap source type.
 
         Args:
-            yml (str): The YAML configuration for the source.
+            spec (dict): The settings of the source, as found in a SourceConfig.
             source_name (str): The name of the source.
         """
-        data = yaml.safe_load(yml)
-        data = data[source_name]
         self.title = source_name
-        self.homepage = data.get("homepage", None)
-        self.description = data.get("description", None)
-        self.icon_url = data.get("icon_url", None)
+        self.homepage = spec.get("homepage", None)
+        self.description = spec.get("description", None)
+        self.icon_url = spec.get("icon_url", None)
 
     def generate_config(self) -> str:
         """
@@ -60,5 +57,5 @@ class SnapType(SourceType):
         return (True, None)
 
     @staticmethod
-    def add_installed_to_db(db):
+    def add_installed_to_db(db, online=False):
         pass
\ No newline at end of file
@@ -1,12 +1,32 @@
+import copy
+import gzip
+import hashlib
+import http.server
+import io
+import json
+import lzma
 import os
+import socket
+import sqlite3
 import shutil
 import unittest
 import tempfile
+import threading
+import time
+from typing import List
+from unittest import mock
 
 import yaml
 
 import sadb
+import sadb.appdata as appdata
 import sadb.source.manager as source_man
+import sadb.source.flatpak as flatpak
+from sadb.cache import DiskCache
+import sadb.watcher as watcher
+import sadb.mirrors as mirrors
+import sadb.utilities as util
+from sadb.source import SourceConfig
 import sadb.yaml_parse as yp
 import sadb.database as db
 import sadb.configuration as cfg
@@ -38,6 +58,35 @@ class TestSaDBClasses(unittest.TestCase):
     def test_from_csl(self):
         self.assertEqual(sadb.from_csl("one,two,three"), ["one", "two", "three"])
 
+    def test_lazy_fields(self):
+        # Apps built from database values decode them when they are read
+        app = sadb.App(
+            "test-app", "Test App", "flathub", "test-app", "", "John Doe", "A test app", "This is a test app",
+            "Test,App", None, "text/html", None, 1, None, 4, None, None, None, None, None, None
+        )
+        self.assertEqual(app.categories, ["Test", "App"])
+        self.assertEqual(app.keywords, [])
+        self.assertEqual(app.mimetypes, ["text/html"])
+        self.assertEqual(app.pricing, sadb.Pricing.FREE)
+        self.assertEqual(app.still_rating, sadb.StillRating.GOLD)
+        self.assertEqual(app.app_license, "Proprietary")
+
+        installed_app = sadb.InstalledApp.from_app(app)
+        self.assertFalse(installed_app.update_available)
+        self.assertEqual(installed_app.as_dict(), {**app.as_dict(), "update_available": False})
+
+    def test_from_column(self):
+        column = (
+            "test-app", "Test App", "flathub", "test-app", "", "John Doe", "A test app", "This is a test app",
+            "Test,App", None, "text/html", None, 1, None, 4, None, None, None, None, None, None
+        )
+        self.assertEqual(sadb.App.from_column(column).as_dict(), sadb.App(*column).as_dict())
+        self.assertEqual(sadb.App.from_column(column).mobile, sadb.MobileType.UNKNOWN)
+
+        installed_app = sadb.InstalledApp.from_column(column + (1,))
+        self.assertTrue(installed_app.update_available)
+        self.assertEqual(installed_app.pricing, sadb.Pricing.FREE)
+
 
 class TestDatabase(unittest.TestCase):
     def setUp(self):
@@ -60,6 +109,14 @@ class TestDatabase(unittest.TestCase):
         self.write_db.conn.commit()
         self.assertEqual(self.read_db.get_all_apps(), [])
 
+    def test_connection_settings(self):
+        self.assertEqual(self.write_db.conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        self.assertEqual(self.read_db.conn.execute("PRAGMA busy_timeout").fetchone()[0], config.db_busy_timeout)
+        self.assertEqual(self.read_db.conn.execute("PRAGMA cache_size").fetchone()[0], -config.db_cache_size)
+        rollback_config = copy.copy(config)
+        rollback_config.db_wal = False
+        self.assertIn("journal_mode = DELETE", db.connection_pragmas(rollback_config, writable=True))
+
     def test_create_db(self):
         if os.path.isfile(config.db_location):
             os.remove(config.db_location)
@@ -105,6 +162,322 @@ class TestDatabase(unittest.TestCase):
         for app in read_apps:
             self.assertIsInstance(app, sadb.App)
 
+    def test_get_apps_pages(self):
+        self.write_db.clear_db()
+        ratings = [sadb.StillRating.GOLD, sadb.StillRating.BRONZE, sadb.StillRating.GOLD, sadb.StillRating.SILVER,
+                   sadb.StillRating.GOLD]
+        for i, rating in enumerate(ratings):
+            self.write_db.add_app(sadb.App(
+                f"test-app{i}", f"Test App {4 - i}", "flathub", f"test-app-{i}", "", "John Doe", "A test app",
+                "This is a test app", ["Game"] if i % 2 else ["Test", "App"], None, None, None, None, None, rating,
+                None, None, None, None, None, None
+            ))
+
+        def all_pages(get_page, *args):
+            pages = [get_page(*args, limit=2)]
+            while pages[-1]:
+                pages.append(get_page(*args, after=pages[-1][-1], limit=2))
+            self.assertEqual([len(page) for page in pages[:-2]], [2] * (len(pages) - 2))
+            return [app.app_id for page in pages for app in page]
+
+        self.assertEqual(all_pages(self.read_db.get_apps_by_name), [f"test-app{i}" for i in range(4, -1, -1)])
+        self.assertEqual(all_pages(self.read_db.get_apps_by_rating),
+                         ["test-app4", "test-app2", "test-app0", "test-app3", "test-app1"])
+        self.assertEqual(all_pages(self.read_db.get_apps_in_category, "Game"), ["test-app3", "test-app1"])
+        self.assertEqual(self.read_db.get_apps_in_category("Gam"), [])
+
+    def test_get_apps_pages_without_names(self):
+        self.write_db.clear_db()
+        for i in range(4):
+            self.write_db.add_app(sadb.App(
+                f"test-app{i}", None if i < 2 else f"Test App {i}", "flathub", f"test-app-{i}", "", "John Doe",
+                "A test app", "This is a test app", ["Game"], None, None, None, None, None, sadb.StillRating.GOLD,
+                None, None, None, None, None, None
+            ))
+        ids = [f"test-app{i}" for i in range(4)]
+        for get_page, args in ((self.read_db.get_apps_by_name, ()), (self.read_db.get_apps_by_rating, ()),
+                               (self.read_db.get_apps_in_category, ("Game",))):
+            for limit in (1, 2, 3):
+                pages = [get_page(*args, limit=limit)]
+                while pages[-1]:
+                    pages.append(get_page(*args, after=pages[-1][-1], limit=limit))
+                self.assertEqual([app.app_id for page in pages for app in page], ids)
+
+    def test_iter_all_apps(self):
+        self.write_db.clear_db()
+        self.write_db.add_apps(
+            sadb.App(f"test-app{i}", f"Test App {i}", "flathub", f"test-app-{i}", "", "John Doe", "A test app",
+                     "This is a test app", [], [], [], "MIT", sadb.Pricing.FREE, sadb.MobileType.UNKNOWN,
+                     sadb.StillRating.UNKNOWN, "", "", "", [], "", [])
+            for i in range(5)
+        )
+        apps = self.read_db.iter_all_apps(batch_size=2)
+        self.assertIsInstance(next(apps), sadb.App)
+        self.assertEqual(len(list(apps)), 4)
+
+    def test_list_field_lookups(self):
+        self.write_db.clear_db()
+        for i in range(3):
+            self.write_db.add_app(sadb.App(
+                f"test-app{i}", f"Test App {i}", "flathub", f"test-app-{i}", "", "John Doe", "A test app",
+                "This is a test app", ["Game", f"Test{i}"], None, ["text/html"] if i else ["text/plain"], None,
+                None, None, sadb.StillRating(i), None, None, None, None, None, None
+            ))
+        self.assertEqual([app.app_id for app in self.read_db.apps_by_category("Game")],
+                         ["test-app0", "test-app1", "test-app2"])
+        self.assertEqual([app.app_id for app in self.read_db.apps_for_mimetype("text/html")],
+                         ["test-app2", "test-app1"])
+        self.assertEqual(self.read_db.category_counts(), {"Game": 3, "Test0": 1, "Test1": 1, "Test2": 1})
+
+        # Links follow apps that are changed or removed
+        self.write_db.sync_apps([
+            sadb.App("test-app1", "Test App 1", "flathub", "test-app-1", "", "John Doe", "A test app",
+                     "This is a test app", ["Office"], None, None, None, None, None, None, None, None, None,
+                     None, None, None)
+        ])
+        self.assertEqual(self.read_db.category_counts(), {"Office": 1})
+        self.assertEqual(self.read_db.apps_for_mimetype("text/html"), [])
+
+    def test_get_installed_apps_from_main_db(self):
+        self.write_db.clear_db()
+        self.write_db.add_apps(
+            sadb.App(f"test-app{i}", f"Test App {i}", "flathub", f"app/test.App{i}/x86_64/stable", "", "John Doe",
+                     "A test app", "This is a test app", [], [], [], "MIT", sadb.Pricing.FREE,
+                     sadb.MobileType.UNKNOWN, sadb.StillRating.UNKNOWN, "", "", "", [], "", [])
+            for i in range(3)
+        )
+        packages = [("flathub", f"app/test.App{i}/x86_64/stable") for i in range(4)] + [("other", "app/test.App0")]
+        apps = self.read_db.get_installed_apps_from_main_db(packages, batch_size=2)
+        self.assertEqual(sorted(apps), packages[:3])
+        self.assertIsInstance(apps[packages[1]], sadb.InstalledApp)
+        self.assertEqual(apps[packages[1]].app_id, "test-app1")
+
+    def test_sync_installed_apps(self):
+        self.write_db.clear_installed_apps()
+        installed_apps = [
+            sadb.InstalledApp(False, f"test-app{i}", f"Test App {i}", "flathub", f"test-app-{i}", "", "John Doe",
+                              "A test app", "This is a test app", ["Test"], [], [], "MIT", sadb.Pricing.FREE,
+                              sadb.MobileType.UNKNOWN, sadb.StillRating.UNKNOWN, "", "", "", [], "", [])
+            for i in range(3)
+        ]
+        self.assertEqual(self.write_db.sync_installed_apps(installed_apps), db.SyncReport(3, 0, 0))
+        self.assertEqual(self.write_db.sync_installed_apps(installed_apps), db.SyncReport(0, 0, 0))
+
+        # One app is uninstalled, one gets an update and one is changed
+        installed_apps[1].update_available = True
+        installed_apps[2].summary = "A changed test app"
+        self.assertEqual(self.write_db.sync_installed_apps(installed_apps[1:]), db.SyncReport(0, 2, 1))
+        self.assertEqual([app.app_id for app in self.read_db.get_app_updates()], ["test-app1"])
+        self.assertEqual(self.read_db.get_installed_app("flathub", "test-app-2").summary, "A changed test app")
+        self.assertIsNone(self.read_db.get_installed_app("flathub", "test-app-0"))
+
+        # Installed apps outside of the scope are kept
+        report = self.write_db.sync_installed_apps([], scope=lambda package: package == "test-app-1")
+        self.assertEqual(report, db.SyncReport(0, 0, 1))
+        self.assertEqual([app.app_id for app in self.read_db.get_installed_apps()], ["test-app2"])
+
+    def test_get_installed_apps(self):
+        self.write_db.clear_installed_apps()
+        installed_app = sadb.InstalledApp.from_app(test_app)
+        installed_app.update_available = True
+        self.write_db.add_installed_app(installed_app)
+
+        app = self.read_db.get_installed_app(test_app.primary_src, test_app.src_pkg_name)
+        self.assertIsInstance(app, sadb.InstalledApp)
+        self.assertTrue(app.update_available)
+        self.assertEqual(app.categories, test_app.categories)
+        self.assertEqual(app.pricing, test_app.pricing)
+        self.assertEqual([app.app_id for app in self.read_db.get_installed_apps()], [test_app.app_id])
+        self.assertEqual([app.app_id for app in self.read_db.get_app_updates()], [test_app.app_id])
+
+    def test_sync_apps(self):
+        self.write_db.clear_db()
+        self.write_db.add_app(test_app)
+
+        changed_app = sadb.App(
+            "firefox", "Firefox 2", "flathub", "org.mozilla.firefox",
+            "https://example.com/icon.png", "John Doe", "A test app",
+            "This is a test app", ["Test", "App"], None, None, None, None, None, None, None, None, None, None, None, None
+        )
+        new_app = sadb.App(
+            "new-app", "New App", "flathub", "new-app",
+            "https://example.com/icon.png", "John Doe", "A new app",
+            "This is a new app", ["Test"], None, None, None, None, None, None, None, None, None, None, None, None
+        )
+        report = self.write_db.sync_apps([changed_app, new_app])
+        self.assertEqual(report, db.SyncReport(1, 1, 0))
+        self.assertEqual(self.read_db.get_app("firefox").name, "Firefox 2")
+
+        # Syncing the same apps again should not write anything
+        self.assertEqual(self.write_db.sync_apps([changed_app, new_app]), db.SyncReport(0, 0, 0))
+
+        self.assertEqual(self.write_db.sync_apps([new_app]), db.SyncReport(0, 0, 1))
+        self.assertIsNone(self.read_db.get_app("firefox"))
+
+    def test_sync_apps_with_numbers(self):
+        self.write_db.clear_db()
+        # YAML parses values such as name: 2048 as numbers, which SQLite stores as text
+        apps = [sadb.App(
+            "2048", 2048, "flathub", "org.example.2048", "", "John Doe", -0.0, 1e20, None, None, None, True,
+            None, None, None, None, None, None, None, None, None
+        )]
+        self.assertEqual(self.write_db.sync_apps(apps), db.SyncReport(1, 0, 0))
+        self.assertEqual(self.write_db.sync_apps(apps), db.SyncReport(0, 0, 0))
+        self.assertEqual(self.read_db.get_app("2048").name, "2048")
+
+    def test_sync_apps_changed_package(self):
+        self.write_db.clear_db()
+        self.write_db.add_app(sadb.App(
+            "test-app", "Old Name", "flathub", "old-pkg", "", "John Doe", "A test app", "This is a test app",
+            ["Old"], None, None, None, None, None, None, None, None, None, None, None, None
+        ))
+        # The same id with another package updates the row in place, which must not leave old links or text behind
+        self.write_db.sync_apps([sadb.App(
+            "test-app", "New Name", "flathub", "new-pkg", "", "John Doe", "A test app", "This is a test app",
+            ["New"], None, None, None, None, None, None, None, None, None, None, None, None
+        )])
+        self.assertEqual(self.read_db.category_counts(), {"New": 1})
+        self.assertEqual(self.read_db.search_apps("old"), [])
+        self.assertEqual([app.src_pkg_name for app in self.read_db.search_apps("new")], ["new-pkg"])
+
+    def test_rebuild(self):
+        self.write_db.clear_db()
+        self.write_db.add_app(test_app)
+        self.write_db.clear_installed_apps()
+        self.write_db.add_installed_app(sadb.InstalledApp.from_app(test_app))
+
+        new_app = sadb.App(
+            "new-app", "New App", "flathub", "new-app",
+            "https://example.com/icon.png", "John Doe", "A new app",
+            "This is a new app", ["Test"], None, None, None, None, None, None, None, None, None, None, None, None
+        )
+        self.write_db.rebuild([new_app, test_app])
+        self.write_db.rebuild([new_app])
+        self.assertFalse(os.path.exists(config.db_location + ".rebuild"))
+        # Readers opened before the rebuild see the new catalog as a whole once it is published
+        self.assertIsNone(self.read_db.get_app("firefox"))
+        self.assertEqual(self.read_db.get_app("new-app").name, "New App")
+
+        with db.ReadableDB(config) as read_db:
+            self.assertEqual([app.app_id for app in read_db.get_all_apps()], ["new-app"])
+            self.assertEqual([app.app_id for app in read_db.search_apps("new")], ["new-app"])
+            self.assertEqual([app.app_id for app in read_db.get_apps_in_category("Test")], ["new-app"])
+            self.assertEqual([app.app_id for app in read_db.get_installed_apps()], [test_app.app_id])
+        self.write_db.add_app(test_app)
+        self.assertEqual(self.write_db.get_app("firefox").name, test_app.name)
+
+    def test_wal_perms(self):
+        with tempfile.TemporaryDirectory() as directory:
+            wal_config = copy.copy(config)
+            wal_config.db_location = os.path.join(directory, "sadb", "sadb.db")
+            fixed = []
+            with mock.patch.object(db.utilities, "is_sudo_root", return_value=True), \
+                    mock.patch.object(db.utilities, "fix_perms", fixed.append):
+                write_db = db.WritableDB(wal_config)
+                self.assertIn(wal_config.db_location + "-wal", fixed)
+                self.assertIn(wal_config.db_location + "-shm", fixed)
+
+                # The write-ahead log can be created again when the catalog is replaced
+                fixed.clear()
+                write_db.rebuild([test_app])
+                self.assertIn(wal_config.db_location + "-wal", fixed)
+                write_db.conn.close()
+
+    def test_search_apps(self):
+        self.write_db.clear_db()
+        self.write_db.add_app(test_app)
+
+        self.assertEqual([app.app_id for app in self.read_db.search_apps("firef")], ["firefox"])
+        self.assertEqual([app.app_id for app in self.read_db.search_apps("private browser")], ["firefox"])
+        self.assertEqual(self.read_db.search_apps("chromium"), [])
+        self.assertEqual(self.read_db.search_apps("firefox", offset=1), [])
+
+        # Replaced apps should not be found by their old text
+        self.write_db.sync_apps([sadb.App(
+            "firefox", "Waterfox", "flathub", "org.mozilla.firefox",
+            "https://example.com/icon.png", "John Doe", "A test app",
+            "This is a test app", ["Test", "App"], None, None, None, None, None, None, None, None, None, None, None, None
+        )])
+        self.assertEqual(self.read_db.search_apps("private"), [])
+        self.assertEqual([app.name for app in self.read_db.search_apps("waterfox")], ["Waterfox"])
+
+    def test_write_batch(self):
+        self.write_db.clear_db()
+        self.write_db.clear_installed_apps()
+        self.write_db.conn.commit()
+        apps = [sadb.App(
+            f"batch-app-{i}", f"Batch App {i}", "flathub", f"batch-app-{i}",
+            "https://example.com/icon.png", "John Doe", "A test app",
+            "This is a test app", ["Test"], None, None, None, None, None, None, None, None, None, None, None, None
+        ) for i in range(5)]
+
+        with self.write_db.batch(chunk_size=2):
+            for app in apps:
+                self.write_db.add_app(app)
+            self.write_db.add_installed_app(sadb.InstalledApp.from_app(apps[0]))
+            with self.assertRaises(ValueError):
+                self.write_db.add_app(apps[0])
+            with self.write_db.batch():  # Joins the outer batch
+                self.write_db.add_installed_app(sadb.InstalledApp.from_app(apps[1]))
+            # Nothing is committed until the batch ends
+            self.assertEqual(self.read_db.get_all_apps(), [])
+        self.assertEqual(sorted(app.app_id for app in self.read_db.get_all_apps()), [app.app_id for app in apps])
+        self.assertEqual([app.app_id for app in self.read_db.get_apps_in_category("Test", limit=1)], ["batch-app-0"])
+        self.assertEqual(len(self.read_db.get_installed_apps()), 2)
+
+        # A batch that raises writes nothing
+        with self.assertRaises(RuntimeError):
+            with self.write_db.batch():
+                self.write_db.add_app(test_app)
+                self.write_db.sync_installed_apps([])  # Joins the batch instead of committing
+                raise RuntimeError()
+        self.assertIsNone(self.read_db.get_app(test_app.app_id))
+        self.assertEqual(len(self.read_db.get_installed_apps()), 2)
+        with self.assertRaises(ValueError):
+            self.write_db.add_app(apps[0])
+
+    def test_write_snapshot(self):
+        self.write_db.clear_db()
+        self.write_db.add_app(test_app)
+        self.write_db.write_snapshot(config.catalog_location)
+
+        with db.CatalogSnapshot(config.catalog_location) as snapshot:
+            self.assertEqual(len(snapshot), 1)
+            self.assertEqual(snapshot.get_column(0), self.read_db.c.execute("SELECT * FROM apps").fetchone()[:21])
+            self.assertEqual(
+                yp.app_to_yaml(snapshot.get_app("firefox")), yp.app_to_yaml(self.read_db.get_app("firefox"))
+            )
+            self.assertIsNone(snapshot.get_app("chromium"))
+
+    def test_migrate_db(self):
+        old_config = cfg.SadbConfig()
+        old_config.db_location = "test/old.db"
+        if os.path.isfile(old_config.db_location):
+            os.remove(old_config.db_location)
+
+        # Create a database with the original schema, which allowed duplicate rows
+        conn = sqlite3.connect(old_config.db_location)
+        conn.execute('''CREATE TABLE apps
+            (id text, name text, primary_src text, src_pkg_name text, icon_url text,
+            author text, summary text, description text, categories text, keywords text,
+            mimetypes text, license text, pricing int, mobile int, still_rating int,
+            still_rating_notes text, homepage text, donate_url text, screenshot_urls text,
+            demo_url text, addons text)''')
+        for _ in range(2):
+            conn.execute(
+                "INSERT INTO apps VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                db.WritableDB.app_to_column(test_app)
+            )
+        conn.commit()
+        conn.close()
+
+        with db.WritableDB(old_config) as write_db:
+            self.assertEqual(write_db.c.execute("PRAGMA user_version").fetchone()[0], db.SCHEMA_VERSION)
+            self.assertEqual(len(write_db.get_all_apps()), 1)
+            self.assertEqual(write_db.get_app("firefox").src_pkg_name, "org.mozilla.firefox")
+            # The hashes of the migrated rows are filled in, so syncing the same app writes nothing
+            self.assertEqual(write_db.sync_apps([test_app]), db.SyncReport(0, 0, 0))
+
     def test_column_to_app(self):
         self.assertEqual(
             self.write_db.column_to_app((
@@ -115,7 +488,7 @@ class TestDatabase(unittest.TestCase):
                 "This is a test app", "https://example.com", "https://example.com/donate",
                  "https://example.com/screenshot1.png,https://example.com/screenshot2.png",
                 "https://example.com/demo", "addon1,addon2"
-            )).__dict__, test_app.__dict__
+            )).as_dict(), test_app.as_dict()
         )
 
 
@@ -239,10 +612,437 @@ google-chrome:
         self.assertEqual(apps[1].app_id, "google-chrome")
         os.remove(file_path)
         
+    def test_iter_apps_from_yaml(self):
+        apps = list(yp.iter_apps_from_yaml(io.StringIO(self.yaml)))
+        self.assertEqual(
+            [yp.app_to_yaml(app) for app in apps],
+            [yp.app_to_yaml(app) for app in yp.get_apps_from_yaml(self.yaml)]
+        )
+        self.assertEqual(list(yp.iter_apps_from_yaml("")), [])
+
+    def test_iter_apps_from_yamls(self):
+        user_yaml = "firefox: {name: My Firefox, src_pkg_name: org.mozilla.firefox}\n"
+        apps = list(yp.iter_apps_from_yamls([io.StringIO(user_yaml), io.StringIO(self.yaml)]))
+        self.assertEqual([app.app_id for app in apps], ["firefox", "google-chrome"])
+        self.assertEqual(apps[0].name, "My Firefox")
+        # Apps are also matched by package name
+        vendor_yaml = "firefox-esr: {name: Firefox ESR, src_pkg_name: org.mozilla.firefox}\n"
+        apps = list(yp.iter_apps_from_yamls([self.yaml, vendor_yaml]))
+        self.assertEqual([app.app_id for app in apps], ["firefox", "google-chrome"])
+
     def test_app_to_yaml(self):
         self.assertEqual(yaml.safe_load(yp.app_to_yaml(test_app)), yaml.safe_load(self.test_app_yaml))
 
 
+class TestDiskCache(unittest.TestCase):
+    def setUp(self):
+        self.path = "test/cache.db"
+        if os.path.isfile(self.path):
+            os.remove(self.path)
+
+    def test_versions(self):
+        with DiskCache(self.path) as cache:
+            cache.set("app/test.App/x86_64/stable", "commit1", {"name": "Test App", "mimetypes": ["text/html"]})
+        with DiskCache(self.path) as cache:
+            self.assertEqual(cache.get("app/test.App/x86_64/stable", "commit1"),
+                             {"name": "Test App", "mimetypes": ["text/html"]})
+            self.assertIsNone(cache.get("app/test.App/x86_64/stable", "commit2"))
+            cache.set("app/test.App/x86_64/stable", "commit2", {"name": "Test App 2"})
+            self.assertEqual(len(cache), 1)
+            self.assertIsNone(cache.get("app/test.App/x86_64/stable", "commit1"))
+
+    def test_eviction(self):
+        with DiskCache(self.path, max_entries=2) as cache:
+            cache.set("a", "1", 1)
+            cache.set("b", "1", 2)
+            cache.get("a", "1")  # b is now the least recently used
+            cache.set("c", "1", 3)
+            self.assertEqual(len(cache), 2)
+            self.assertIsNone(cache.get("b", "1"))
+            self.assertEqual(cache.get("a", "1"), 1)
+
+
+class TestAppdata(unittest.TestCase):
+    appdata_xml = b"""<components>
+        <component><id>org.example.App</id><name>App</name><name xml:lang="de">Anwendung</name></component>
+    </components>"""
+
+    def test_extract_component(self):
+        component = appdata.extract_component(gzip.compress(self.appdata_xml))
+        self.assertIn(b"<name>App</name>", component)
+        self.assertNotIn(b"Anwendung", component)
+        self.assertIsNone(appdata.extract_component(None))
+        self.assertIsNone(appdata.extract_component(b"not gzip"))
+        self.assertIsNone(appdata.extract_component(gzip.compress(b"<components>")))
+        # A damaged deflate stream raises zlib.error rather than OSError
+        self.assertIsNone(appdata.extract_component(self.corrupt_appdata()))
+
+    @classmethod
+    def corrupt_appdata(cls) -> bytes:
+        corrupt = bytearray(gzip.compress(cls.appdata_xml))
+        corrupt[10] = 0xff
+        return bytes(corrupt)
+
+    @classmethod
+    def write_appstream_dir(cls, directory: str) -> List[str]:
+        """
+        Fills a directory with enough appdata files for extract_components to use its process pool, alternating
+        valid and corrupt ones, and returns their paths in order.
+        """
+        paths = []
+        for i in range(appdata.PARALLEL_THRESHOLD):
+            paths.append(os.path.join(directory, f"org.example.App{i}.xml.gz"))
+            with open(paths[-1], "wb") as file:
+                file.write(cls.corrupt_appdata() if i % 2 else gzip.compress(cls.appdata_xml))
+        return paths
+
+    def test_extract_components(self):
+        with tempfile.TemporaryDirectory() as directory:
+            files = []
+            for path in self.write_appstream_dir(directory):
+                with open(path, "rb") as file:
+                    files.append(file.read())
+        components = appdata.extract_components(files + [None])
+        self.assertEqual([component is not None for component in components],
+                         [i % 2 == 0 for i in range(appdata.PARALLEL_THRESHOLD)] + [False])
+        self.assertIn(b"<name>App</name>", components[0])
+        self.assertEqual(appdata.extract_components(files[:2]), components[:2])
+
+
+class TestFileHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serves the files of a TestFileServer with validators, conditional requests and byte ranges.
+    """
+    last_modified = "Wed, 21 Oct 2015 07:28:00 GMT"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append((self.path, dict(self.headers)))
+        data = self.server.files.get(self.path)
+        if data is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        etag = f'"{hashlib.sha1(data).hexdigest()}"'
+        if self.headers.get("If-None-Match", self.headers.get("If-Modified-Since")) in (etag, self.last_modified):
+            self.send_response(304)
+            self.end_headers()
+            return
+        start = 0
+        if "Range" in self.headers and self.headers.get("If-Range", etag) in (etag, self.last_modified):
+            start = int(self.headers["Range"].split("=")[1].split("-")[0])
+            if start >= len(data):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(data)}")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+        else:
+            self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", self.last_modified)
+        self.send_header("Content-Length", str(len(data) - start))
+        self.end_headers()
+        if self.server.drops:
+            # Reset the connection after sending this many bytes of the body
+            self.wfile.write(data[start:start + self.server.drops.pop(0)])
+            self.wfile.flush()
+            self.connection.shutdown(socket.SHUT_RDWR)
+            return
+        self.wfile.write(data[start:])
+
+
+class TestFileServer(http.server.ThreadingHTTPServer):
+    """
+    Local HTTP server for the download tests.
+
+    Attributes:
+        files (Dict[str, bytes]): The content of each path served.
+        requests (List[tuple]): The path and headers of each request received.
+        drops (List[int]): The number of bytes sent before resetting the connection, for each of the next responses.
+    """
+    def __init__(self, files: dict):
+        super().__init__(("127.0.0.1", 0), TestFileHandler)
+        self.files = files
+        self.requests = []
+        self.drops = []
+        threading.Thread(target=self.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+
+class TestDownloadCache(unittest.TestCase):
+    data = b"".join(b"app%d:\n  name: App %d\n" % (i, i) for i in range(5000))
+
+    def setUp(self):
+        self.retry_delay = util.RETRY_DELAY
+        util.RETRY_DELAY = 0
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.directory.name, "downloads")
+        self.server = TestFileServer({"/repo.yaml": self.data})
+        self.url = self.server.url + "/repo.yaml"
+
+    def tearDown(self):
+        self.server.close()
+        self.directory.cleanup()
+        util.RETRY_DELAY = self.retry_delay
+
+    def open(self, force: bool = False):
+        return util.open_cached_yaml_stream(self.url, self.cache_dir, force=force)
+
+    def test_conditional_download(self):
+        with self.open() as stream:
+            self.assertFalse(stream.cached)
+            self.assertEqual(stream.read(), self.data)
+            stream.commit()
+        with open(stream.path + ".json") as file:
+            validators = json.load(file)
+        self.assertEqual(validators["url"], self.url)
+        self.assertEqual(validators["etag"], f'"{hashlib.sha1(self.data).hexdigest()}"')
+        self.assertEqual(validators["last_modified"], TestFileHandler.last_modified)
+
+        self.assertIsNone(self.open())
+        headers = self.server.requests[-1][1]
+        self.assertEqual(headers["If-None-Match"], validators["etag"])
+        self.assertEqual(headers["If-Modified-Since"], validators["last_modified"])
+        with self.open(force=True) as stream:
+            self.assertTrue(stream.cached)
+            self.assertEqual(stream.read(), self.data)
+
+        self.server.files["/repo.yaml"] = b"app: {}\n"
+        with self.open() as stream:
+            self.assertEqual(stream.read(), b"app: {}\n")
+        # Without commit the new file is downloaded again
+        with self.open() as stream:
+            self.assertFalse(stream.cached)
+            stream.commit()
+        self.assertIsNone(self.open())
+
+    def test_resume(self):
+        self.server.drops = [len(self.data) // 3]
+        with self.open() as stream:
+            self.assertEqual(stream.read(), self.data)
+            stream.commit()
+        headers = self.server.requests[-1][1]
+        # The block being read when the connection reset is lost, the download resumes after what was saved
+        self.assertLessEqual(int(headers["Range"][6:-1]), len(self.data) // 3)
+        self.assertEqual(headers["If-Range"], f'"{hashlib.sha1(self.data).hexdigest()}"')
+        self.assertIsNone(self.open())
+
+    def test_resume_next_run(self):
+        with self.open() as stream:
+            stream.read(1000)  # Interrupted after the first 1000 bytes
+        with self.open() as stream:
+            self.assertEqual(stream.read(), self.data)
+        headers = self.server.requests[-1][1]
+        self.assertEqual(headers["Range"], "bytes=1000-")
+        self.assertEqual(headers["If-Range"], f'"{hashlib.sha1(self.data).hexdigest()}"')
+
+    def test_resume_changed_file(self):
+        with self.open() as stream:
+            stream.read(1000)
+        # The If-Range validator no longer matches, so the server sends the new file from the start
+        self.server.files["/repo.yaml"] = self.data[::-1]
+        with self.open() as stream:
+            self.assertEqual(stream.read(), self.data[::-1])
+        self.assertIn("If-Range", self.server.requests[-1][1])
+
+    def test_mirror_failover(self):
+        mirror = TestFileServer({"/repo.yaml": self.data})
+        self.addCleanup(mirror.close)
+        # The first mirror answers every resume, then resets the connection before sending anything
+        self.server.drops = [len(self.data) // 3] + [0] * 100
+        with util.open_cached_yaml_stream(self.url, self.cache_dir, mirrors=[self.url, mirror.url + "/repo.yaml"]) \
+                as stream:
+            self.assertEqual(stream.read(), self.data)
+            stream.commit()
+        self.assertEqual(len(self.server.requests), util.RETRIES + 2)
+        self.assertEqual(len(mirror.requests), 1)
+        self.assertIn("Range", mirror.requests[0][1])
+        self.assertNotIn("If-Range", mirror.requests[0][1])
+
+    def test_restart_unsatisfiable_range(self):
+        with self.open() as stream:
+            stream.read()  # The whole file is saved, but was not used
+        with self.open() as stream:
+            self.assertEqual(stream.read(), self.data)
+        self.assertEqual([request[1].get("Range") for request in self.server.requests[1:]],
+                         [f"bytes={len(self.data)}-", None])
+
+    def test_compressed_download(self):
+        self.server.files["/repo.yaml.gz"] = gzip.compress(self.data)
+        with util.open_compressed_yaml_stream(self.url, self.cache_dir) as stream:
+            self.assertIsInstance(stream, util.DecompressedStream)
+            self.assertFalse(stream.cached)
+            self.assertEqual(stream.read(), self.data)
+            stream.commit()
+        # Missing variants are skipped, the first one published is used
+        self.assertEqual([request[0] for request in self.server.requests],
+                         [f"/repo.yaml{extension}" for extension, _ in util.YAML_COMPRESSIONS])
+        self.assertIsNone(util.open_compressed_yaml_stream(self.url, self.cache_dir))
+        with util.open_compressed_yaml_stream(self.url, self.cache_dir, force=True) as stream:
+            self.assertTrue(stream.cached)
+            self.assertEqual(stream.read(), self.data)
+
+        # The variant served before is asked first, and kept while it is still served
+        self.server.files["/repo.yaml.xz"] = lzma.compress(self.data[::-1])
+        del self.server.requests[:]
+        self.assertIsNone(util.open_compressed_yaml_stream(self.url, self.cache_dir))
+        self.assertEqual([request[0] for request in self.server.requests], ["/repo.yaml.gz"])
+        del self.server.files["/repo.yaml.gz"]
+        with util.open_compressed_yaml_stream(self.url, self.cache_dir) as stream:
+            self.assertEqual(stream.read(), self.data[::-1])
+            stream.commit()
+        del self.server.requests[:]
+        self.assertIsNone(util.open_compressed_yaml_stream(self.url, self.cache_dir))
+        self.assertEqual([request[0] for request in self.server.requests], ["/repo.yaml.xz"])
+
+    def test_uncompressed_download(self):
+        with util.open_compressed_yaml_stream(self.url, self.cache_dir) as stream:
+            self.assertIsInstance(stream, util.CachedDownloadStream)
+            self.assertEqual(stream.read(), self.data)
+            stream.commit()
+        del self.server.requests[:]
+        self.assertIsNone(util.open_compressed_yaml_stream(self.url, self.cache_dir))
+        self.assertEqual([request[0] for request in self.server.requests], ["/repo.yaml"])
+
+        del self.server.files["/repo.yaml"]
+        with self.assertRaises(util.MissingFileException):
+            util.open_compressed_yaml_stream(self.url, self.cache_dir)
+
+    def test_decompressed_stream_resume(self):
+        compressed = gzip.compress(self.data)
+        self.server.files["/repo.yaml.gz"] = compressed
+        self.server.drops = [len(compressed) // 2]
+        with util.open_compressed_yaml_stream(self.url, self.cache_dir) as stream:
+            stream.fetch()
+            self.assertEqual(stream.read(), self.data)
+            stream.commit()
+        self.assertIn("Range", self.server.requests[-1][1])
+        self.assertIsNone(util.open_compressed_yaml_stream(self.url, self.cache_dir))
+
+
+class TestUpdateDb(unittest.TestCase):
+    def setUp(self):
+        import sadb.__main__ as main  # Imported here as it imports these tests
+        self.main = main
+        self.directory = tempfile.TemporaryDirectory()
+        self.server = TestFileServer({"/repo.yaml": TestYamlParse.yaml.encode("utf-8")})
+        self.config = copy.copy(config)
+        self.config.repo_url = self.server.url + "/"
+        self.config.user_repo_urls = []
+        self.config.extra_repo_urls = []
+        self.config.mirror_urls = []
+        self.config.db_location = os.path.join(self.directory.name, "sadb.db")
+        self.config.verbose = False
+
+    def tearDown(self):
+        self.server.close()
+        self.directory.cleanup()
+
+    def update_db(self):
+        with mock.patch.object(self.main, "CONFIG", self.config):
+            self.main.update_db.callback()
+
+    def app_ids(self):
+        with db.ReadableDB(self.config) as read_db:
+            return sorted(app.app_id for app in read_db.get_all_apps())
+
+    def test_update_db(self):
+        self.update_db()
+        app_ids = self.app_ids()
+        self.assertIn("firefox", app_ids)
+        snapshot_time = os.stat(self.config.catalog_location).st_mtime_ns
+
+        # Nothing changed, so the snapshot is not written again
+        self.update_db()
+        self.assertEqual(os.stat(self.config.catalog_location).st_mtime_ns, snapshot_time)
+
+        # The server still has nothing new, the cached copy is imported into the new database
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.config.db_location + suffix):
+                os.remove(self.config.db_location + suffix)
+        self.update_db()
+        self.assertEqual(self.app_ids(), app_ids)
+
+        os.remove(self.config.catalog_location)
+        self.update_db()
+        with db.CatalogSnapshot(self.config.catalog_location) as snapshot:
+            self.assertEqual(len(snapshot), len(app_ids))
+        self.assertEqual([request[1].get("If-None-Match") is not None for request in self.server.requests
+                          if request[0] == "/repo.yaml"], [False, True, True, True])
+
+
+class TestMirrors(unittest.TestCase):
+    urls = ["https://example.com/repo.yaml", "https://mirror.example.org/repo.yaml"]
+
+    def test_estimate(self):
+        slow = mirrors.MirrorScore(self.urls[0], 0.05, 1e5)
+        fast = mirrors.MirrorScore(self.urls[1], 0.2, 1e7)
+        self.assertLess(fast.estimate, slow.estimate)
+        self.assertEqual(mirrors.MirrorScore(self.urls[0], None, None).estimate, float("inf"))
+
+    def test_cached_ranking(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "mirrors.json")
+            self.assertEqual(mirrors.rank_mirrors(self.urls[:1], path, 60), self.urls[:1])
+            self.assertFalse(os.path.exists(path))  # A single mirror is not probed
+            with open(path, "w") as file:
+                json.dump({"urls": self.urls, "time": time.time(), "ranking": self.urls[::-1]}, file)
+            self.assertEqual(mirrors.rank_mirrors(self.urls[::-1], path, 60), self.urls[::-1])
+
+
+class TestWatcher(unittest.TestCase):
+    def test_inotify(self):
+        with tempfile.TemporaryDirectory() as directory, watcher.Inotify() as inotify:
+            inotify.add_watch(directory)
+            self.assertEqual(inotify.read(timeout=0), [])
+            os.mkdir(os.path.join(directory, "org.example.App"))
+            events = inotify.read(timeout=1)
+            self.assertEqual([(event.path, event.name) for event in events], [(directory, "org.example.App")])
+            self.assertTrue(events[0].mask & watcher.IN_CREATE)
+
+    def test_watch(self):
+        with tempfile.TemporaryDirectory() as directory:
+            changes = watcher.watch([directory, os.path.join(directory, "missing")], debounce=0.1)
+
+            def install():
+                for name in ("org.example.App", ".changed"):
+                    with open(os.path.join(directory, name), "w") as file:
+                        file.write(name)
+            timer = threading.Timer(0.1, install)
+            timer.start()
+            self.assertEqual(next(changes), {directory: {"org.example.App", ".changed"}})
+            timer.join()
+            changes.close()
+
+    def test_watch_created_directory(self):
+        with tempfile.TemporaryDirectory() as directory:
+            app_path = os.path.join(directory, "flatpak", "app")
+            changes = watcher.watch([app_path], debounce=0.1)
+
+            # The directory is only watched once it appears, so what it had by then is unknown
+            timer = threading.Timer(0.1, os.makedirs, (app_path,))
+            timer.start()
+            self.assertEqual(next(changes), {app_path: set()})
+            timer.join()
+
+            timer = threading.Timer(0.1, os.mkdir, (os.path.join(app_path, "org.example.App"),))
+            timer.start()
+            self.assertEqual(next(changes), {app_path: {"org.example.App"}})
+            timer.join()
+            changes.close()
+
+
 class TestSourceMan(unittest.TestCase):
     source_yaml = """flathub:
   source_type: flatpak
@@ -285,6 +1085,15 @@ gpgkey = mQINBFlD2sABEADsiUZUOYBg1UdDaWkEdJYkTSZD68214m8Q1fbrP5AptaUfCl8KYKFMNoA
 """.replace("\n", ""))
 
 
+    def test_source_config(self):
+        source_config = SourceConfig.from_yaml(self.source_yaml)
+        self.assertEqual(list(source_config), ["flathub", "snap"])
+
+        # Sources created from the parsed config should match ones created from the YAML
+        source = source_man.FlatpakType.from_spec(source_config["flathub"], "flathub")
+        self.assertEqual(source.__dict__, source_man.FlatpakType(self.source_yaml, "flathub").__dict__)
+        self.assertEqual(source.alt_urls, ["https://front-ams.flathub.org/repo", "https://front-hex2.flathub.org/repo"])
+
     # MAKE SURE TO UPDATE THIS WHEN YOU ADD MORE SOURCES
     def test_flatpak_checking(self):
         if os.path.exists("sources"):
@@ -328,4 +1137,134 @@ comment = https://dl.flathub.org/repo/logo.svg
 icon = https://dl.flathub.org/repo/logo.svg
 gpgkey = mQINBFlD2sABEADsiUZUOYBg1UdDaWkEdJYkTSZD68214m8Q1fbrP5AptaUfCl8KYKFMNoAJRBXn9FbE6q6VBzghHXj/rSnA8WPnkbaEWR7xltOqzB1yHpCQ1l8xSfH5N02DMUBSRtD/rOYsBKbaJcOgW0K21sX+BecMY/AI2yADvCJEjhVKrjR9yfRX+NQEhDcbXUFRGt9ZT+TI5yT4xcwbvvTu7aFUR/dH7+wjrQ7lzoGlZGFFrQXSs2WI0WaYHWDeCwymtohXryF8lcWQkhH8UhfNJVBJFgCY8Q6UHkZG0FxMu8xnIDBMjBmSZKwKQn0nwzwM2afskZEnmNPYDI8nuNsSZBZSAw+ThhkdCZHZZRwzmjzyRuLLVFpOj3XryXwZcSefNMPDkZAuWWzPYjxS80cm2hG1WfqrG0Gl8+iX69cbQchb7gbEb0RtqNskTo9DDmO0bNKNnMbzmIJ3/rTbSahKSwtewklqSP/01o0WKZiy+n/RAkUKOFBprjJtWOZkc8SPXV/rnoS2dWsJWQZhuPPtv3tefdDiEyp7ePrfgfKxuHpZES0IZRiFI4J/nAUP5bix+srcIxOVqAam68CbAlPvWTivRUMRVbKjJiGXIOJ78wAMjqPg3QIC0GQ0EPAWwAOzzpdgbnG7TCQetaVV8rSYCuirlPYN+bJIwBtkOC9SWLoPMVZTwQARAQABtC5GbGF0aHViIFJlcG8gU2lnbmluZyBLZXkgPGZsYXRodWJAZmxhdGh1Yi5vcmc+iQJUBBMBCAA+FiEEblwF2XnHba+TwIE1QYTdTZB6fK4FAllD2sACGwMFCRLMAwAFCwkIBwIGFQgJCgsCBBYCAwECHgECF4AACgkQQYTdTZB6fK5RJQ/+Ptd4sWxaiAW91FFk7+wmYOkEe1NY2UDNJjEEz34PNP/1RoxveHDt43kYJQ23OWaPJuZAbu+fWtjRYcMBzOsMCaFcRSHFiDIC9aTp4ux/mo+IEeyarYt/oyKb5t5lta6xaAqg7rwt65jW5/aQjnS4h7eFZ+dAKta7Y/fljNrOznUp81/SMcx4QA5G2Pw0hs4Xrxg59oONOTFGBgA6FF8WQghrpR7SnEe0FSEOVsAjwQ13Cfkfa7b70omXSWp7GWfUzgBKyoWxKTqzMN3RQHjjhPJcsQnrqH5enUu4Pcb2LcMFpzimHnUgb9ft72DP5wxfzHGAWOUiUXHbAekfq5iFks8cha/RST6wkxG3Rf44Zn09aOxh1btMcGL+5xb1G0BuCQnA0fP/kDYIPwh9z22EqwRQOspIcvGeLVkFeIfubxpcMdOfQqQnZtHMCabV5Q/Rk9K1ZGc8M2hlg8gHbXMFch2xJ0Wu72eXbA/UY5MskEeBgawTQnQOK/vNm7t0AJMpWK26Qg6178UmRghmeZDj9uNRc3EI1nSbgvmGlpDmCxaAGqaGL1zW4KPW5yN25/qeqXcgCvUjZLI9PNq3Kvizp1lUrbx7heRiSoazCucvHQ1VHUzcPVLUKKTkoTP8okThnRRRsBcZ1+jI4yMWIDLOCT7IW3FePr+3xyuy5eEo9a25Ag0EWUPa7AEQALT/CmSyZ8LWlRYQZKYw417p7Z2hxqd6TjwkwM3IQ1irumkWcTZBZIbBgrSOg6CcXD2oWydCQHWi9qaxhuhEl2bJL5LskmBcMxVdQeD0LLHd8QUnbnnIby8ocvWN1alPfvJFjCUTrmD22U1ycOzRw2lIe4kiQONbOZtdWrVImQQSndjFlisitbmlWHvHm2lOOYy8+GJB7YffVV193hmnBSJffCy4bvkuLxsI+n1DhOzc7MPV3z6HGk4HiEcF0yyt9tCYhpsxHFdBoq2h771HfAcS0s98EVAqYMFnf9em+4cnYpdI6mhIfS1FQiKl6DBAYA8tT3ggla00DurPo0JwX/zN+PaO5h/6O9aCZwV7G6rbkgMuqMergXaf8oP38gr0z+MqWnkfM63Bodq68GP4l4hd02BoFBbDf38TMuGQB14+twJMdfbAxo2MbgluvQgfwHfZ2ca6gyEY+9s/YD1gugLjV+S6CB51WkFNe1z4tAPgJZNxUcKCbeaHNbthl8Hks/pY9RCEseX/EdfzF18epbSjJMPh4DPQXbUoFwmyuYcoBOPmvZHNl9hK7B/1RP8w1ZrXk8qdupC0SNbafX7270B7lMMVImzZetGsM9ypXJ6llhp3FwW09iseNyGJGPsr/dvTMGDXqOPfU/9SAS1LSTY4K9PbRtdrBE318YX8mIk5ABEBAAGJBHIEGAEIACYWIQRuXAXZecdtr5PAgTVBhN1NkHp8rgUCWUPa7AIbAgUJEswDAAJACRBBhN1NkHp8rsF0IAQZAQgAHRYhBFSmzd2JGfsgQgDYrFYnAunj7X7oBQJZQ9rsAAoJEFYnAunj7X7oR6AP/0KYmiAFeqx14Z43/6s2gt3VhxlSd8bmcVV7oJFbMhdHBIeWBp2BvsUf00I0Zl14ZkwCKfLwbbORC2eIxvzJ+QWjGfPhDmS4XUSmhlXxWnYEveSek5Tde+fmu6lqKM8CHg5BNx4GWIX/vdLi1wWJZyhrUwwICAxkuhKxuP2Z1An48930eslTD2GGcjByc27+9cIZjHKa07I/aLffo04V+oMT9/tgzoquzgpVV4jwekADo2MJjhkkPveSNI420bgT+Q7Fi1l0X1aFUniBvQMsaBa27PngWm6xE2ZYvh7nWCdd5g0c0eLIHxWwzV1lZ4Ryx4ITO/VL25ItECcjhTRdYa64sA62MYSaB0x3eR+SihpgP3wSNPFu3MJo6FKTFdi4CBAEmpWHFW7FcRmd+cQXeFrHLN3iNVWryy0HK/CUEJmiZEmpNiXecl4vPIIuyF0zgSCztQtKoMr+injpmQGC/rF/ELBVZTUSLNB350S0Ztvw0FKWDAJSxFmoxt3xycqvvt47rxTrhi78nkk6jATKGyvP55sO+K7Q7Wh0DXA69hvPrYW2eu8jGCdVGxi6HX7L1qcfEd0378S71dZ3g9o6KKl1OsDWWQ6MJ6FGBZedl/ibRfs8p5+sbCX3lQSjEFy3rx6n0rUrXx8U2qb+RCLzJlmC5MNBOTDJwHPcX6gKsUcXZrEQALmRHoo3SrewO41RCr+5nUlqiqV3AohBMhnQbGzyHf2+drutIaoh7Rj80XRh2bkkuPLwlNPf+bTXwNVGse4bej7B3oV6Ae1N7lTNVF4Qh+1OowtGjmfJPWo0z1s6HFJVxoIof9z58Msvgao0zrKGqaMWaNQ6LUeC9g9Aj/9Uqjbo8X54aLiYs8Z1WNc06jKP+gv8AWLtv6CR+l2kLez1YMDucjm7v6iuCMVAmZdmxhg5I/X2+OM3vBsqPDdQpr2TPDLX3rCrSBiS0gOQ6DwN5N5QeTkxmY/7QO8bgLo/Wzu1iilH4vMKW6LBKCaRx5UEJxKpL4wkgITsYKneIt3NTHo5EOuaYk+y2+Dvt6EQFiuMsdbfUjs3seIHsghX/cbPJa4YUqZAL8C4OtVHaijwGo0ymt9MWvS9yNKMyT0JhN2/BdeOVWrHk7wXXJn/ZjpXilicXKPx4udCF76meE+6N2u/T+RYZ7fP1QMEtNZNmYDOfA6sViuPDfQSHLNbauJBo/n1sRYAsL5mcG22UDchJrlKvmK3EOADCQg+myrm8006LltubNB4wWNzHDJ0Ls2JGzQZCd/xGyVmUiidCBUrD537WdknOYE4FD7P0cHaM9brKJ/M8LkEH0zUlo73bY4XagbnCqve6PvQb5G2Z55qhWphd6f4B6DGed86zJEa/RhS
 """)
-        self.assertTrue(source.check_config()[0])
\ No newline at end of file
+        self.assertTrue(source.check_config()[0])
+
+
+class FakeInstalledRef:
+    """
+    Stands in for a Flatpak.InstalledRef, with its appdata read from a file.
+    """
+    def __init__(self, name: str, appdata_path: str = None, origin: str = "flathub", commit: str = "commit1",
+                 deploy_dir: str = None):
+        self.name = name
+        self.appdata_path = appdata_path
+        self.origin = origin
+        self.commit = commit
+        self.deploy_dir = deploy_dir
+
+    def format_ref(self) -> str:
+        return f"app/{self.name}/x86_64/stable"
+
+    def get_name(self) -> str:
+        return self.name
+
+    def get_origin(self) -> str:
+        return self.origin
+
+    def get_commit(self) -> str:
+        return self.commit
+
+    def get_deploy_dir(self) -> str:
+        return self.deploy_dir
+
+    def load_appdata(self, cancellable):
+        if self.appdata_path is None:
+            raise flatpak.GLib.GError("No appdata")
+        with open(self.appdata_path, "rb") as file:
+            data = file.read()
+        return type("FakeBytes", (), {"get_data": lambda _: data})()
+
+
+class TestFlatpak(unittest.TestCase):
+    def test_load_components(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = TestAppdata.write_appstream_dir(directory)
+            refs = [FakeInstalledRef(f"org.example.App{i}", path) for i, path in enumerate(paths)]
+            refs.append(FakeInstalledRef("org.example.NoAppdata"))
+            components = flatpak.load_components(refs)
+
+        # The corrupt files and the ref without appdata get None, the others keep their component
+        self.assertEqual([component is not None for component in components],
+                         [i % 2 == 0 for i in range(len(paths))] + [False])
+
+    def test_get_app_fields_without_appdata(self):
+        with tempfile.TemporaryDirectory() as directory:
+            ref = FakeInstalledRef("org.example.NoAppdata")
+            with DiskCache(os.path.join(directory, "cache")) as cache:
+                fields = flatpak.FlatpakType._get_app_fields(None, [ref], cache)
+                self.assertEqual(fields[0]["name"], "org.example.NoAppdata")
+                self.assertEqual(fields[0]["description"], "This is an unknown app")
+                # The placeholder is not kept, so the appdata is loaded again once it can be
+                self.assertIsNone(cache.get(ref.format_ref(), ref.get_commit()))
+
+    def write_summary(self, summary_dir: str, remote: str, mtime: float):
+        os.makedirs(summary_dir, exist_ok=True)
+        path = os.path.join(summary_dir, f"{remote}.idx")
+        with open(path, "wb") as file:
+            file.write(b"summary")
+        os.utime(path, (mtime, mtime))
+
+    def fake_installation(self, path: str, remote_commits: dict):
+        """
+        Stands in for a Flatpak.Installation at path whose cached summaries list the given commit of each ref,
+        keyed by remote. Remotes without a cached summary raise a GError, as libflatpak does.
+        """
+        def list_remote_refs_sync_full(remote, flags, cancellable):
+            if remote not in remote_commits:
+                raise flatpak.GLib.GError("No cached summary")
+            return [FakeInstalledRef(name, origin=remote, commit=commit)
+                    for name, commit in remote_commits[remote].items()]
+
+        installation_path = type("FakeFile", (), {"get_path": lambda _: path})()
+        return type("FakeInstallation", (), {
+            "get_path": lambda _: installation_path,
+            "list_remote_refs_sync_full": lambda _, *args: list_remote_refs_sync_full(*args)
+        })()
+
+    def test_get_cached_updates(self):
+        with tempfile.TemporaryDirectory() as directory:
+            summary_dir = os.path.join(directory, "repo", "tmp", "cache", "summaries")
+            deploy_dir = os.path.join(directory, "deploy")
+            os.makedirs(deploy_dir)
+            with open(os.path.join(deploy_dir, "deploy"), "wb"):
+                pass
+            deployed_at = os.path.getmtime(os.path.join(deploy_dir, "deploy"))
+            installation = self.fake_installation(directory, {"flathub": {"org.example.App": "commit2"}})
+            ref = FakeInstalledRef("org.example.App", commit="commit1", deploy_dir=deploy_dir)
+
+            # A summary cached after the ref was deployed lists a newer commit
+            self.write_summary(summary_dir, "flathub", deployed_at + 60)
+            self.assertEqual(flatpak.summary_cached_at(summary_dir, "flathub"), deployed_at + 60)
+            self.assertEqual(flatpak.get_cached_updates(installation, [ref]), {ref.format_ref()})
+
+            # The ref was updated online after the summary was cached, so it is already newer
+            self.write_summary(summary_dir, "flathub", deployed_at - 60)
+            self.assertEqual(flatpak.get_cached_updates(installation, [ref]), set())
+
+            # The deployed commit is the one the summary lists
+            self.write_summary(summary_dir, "flathub", deployed_at + 60)
+            current = FakeInstalledRef("org.example.App", commit="commit2", deploy_dir=deploy_dir)
+            self.assertEqual(flatpak.get_cached_updates(installation, [current]), set())
+
+    def test_get_cached_updates_without_summary(self):
+        with tempfile.TemporaryDirectory() as directory:
+            summary_dir = os.path.join(directory, "repo", "tmp", "cache", "summaries")
+            ref = FakeInstalledRef("org.example.App", commit="commit1", deploy_dir=directory)
+
+            # Nothing was ever cached for the remote
+            self.assertIsNone(flatpak.summary_cached_at(summary_dir, "flathub"))
+            installation = self.fake_installation(directory, {})
+            self.assertEqual(flatpak.get_cached_updates(installation, [ref]), set())
+
+            # The summary cache is a file instead of a directory, so it can't be dated
+            os.makedirs(os.path.dirname(summary_dir))
+            with open(summary_dir, "wb"):
+                pass
+            self.assertIsNone(flatpak.summary_cached_at(summary_dir, "flathub"))
+            installation = self.fake_installation(directory, {"flathub": {"org.example.App": "commit2"}})
+            self.assertEqual(flatpak.get_cached_updates(installation, [ref]), set())
+
+            # Other remotes' summaries don't count for this one
+            shutil.rmtree(os.path.dirname(summary_dir))
+            self.write_summary(summary_dir, "flathub-beta", time.time() + 60)
+            self.assertIsNone(flatpak.summary_cached_at(summary_dir, "flathub"))
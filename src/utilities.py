@@ -1,8 +1,33 @@
+import gzip
+import hashlib
+import io
+import json
+import lzma
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
 import requests
+import urllib3
 from tqdm import tqdm
 import os
 import pwd
 
+try:
+    import zstandard
+except ImportError:  # zstd compressed files are skipped without the optional zstandard package
+    zstandard = None
+
+# Seconds to wait for the server to respond, or between two pieces of data
+TIMEOUT = 30
+# Number of times a failed request is tried again, waiting RETRY_DELAY seconds and then twice as long each time
+RETRIES = 3
+RETRY_DELAY = 1
+# Default number of bytes read from a connection at a time
+BLOCK_SIZE = 1024 * 1024
+# Maximum number of files downloaded at the same time
+MAX_PARALLEL_DOWNLOADS = 4
+
 
 def get_current_user():
     """
@@ -49,13 +74,14 @@ class DownloadException(Exception):
         super().__init__("Unable to download yaml file, please check your internet:\n" + message)
 
 
-def download_yaml(url, verbose=False):
+def download_yaml(url, verbose=False, block_size=BLOCK_SIZE):
     """
     Function to download a YAML file.
 
     Args:
         url (str): The URL of the YAML file.
         verbose (bool): Whether to show the progress of the download.
+        block_size (int): The number of bytes read from the connection at a time.
 
     Returns:
         str: The content of the YAML file.
@@ -66,7 +92,6 @@ def download_yaml(url, verbose=False):
     response = requests.get(url, stream=True)
 
     total_size_in_bytes = int(response.headers.get('content-length', 0))
-    block_size = 1024  # 1 kb
 
     response.raise_for_status()
 
@@ -75,7 +100,8 @@ def download_yaml(url, verbose=False):
     else:
         progress_bar = None
 
-    yaml_data = b''
+    # Appending to a bytearray grows it in place, unlike bytes which are copied on every append
+    yaml_data = bytearray()
 
     for data in response.iter_content(block_size):
         if verbose:
@@ -88,4 +114,529 @@ def download_yaml(url, verbose=False):
     if total_size_in_bytes == 0:
         raise DownloadException()
 
-    return yaml_data.decode('utf-8')
\ No newline at end of file
+    return yaml_data.decode('utf-8')
+
+
+class MissingFileException(DownloadException):
+    """
+    Exception class for files that are not published on the server.
+    """
+
+
+def _request(session: requests.Session, url: str, headers: dict, retries: int = RETRIES) -> requests.Response:
+    """
+    Starts a streamed GET request, trying again after connection errors and server errors.
+    """
+    for attempt in range(retries + 1):
+        try:
+            response = session.get(url, headers=headers, stream=True, timeout=TIMEOUT)
+            if response.status_code < 500 or attempt == retries:
+                return response
+            response.close()
+        except (requests.ConnectionError, requests.Timeout) as error:
+            if attempt == retries:
+                raise DownloadException(str(error))
+        time.sleep(RETRY_DELAY * 2 ** attempt)
+
+
+def _content_range_size(response: requests.Response) -> Optional[int]:
+    """
+    Returns the size of the whole file according to the Content-Range header of a partial response.
+    """
+    size = response.headers.get("Content-Range", "").rpartition("/")[2]
+    return int(size) if size.isdigit() else None
+
+
+def _read_validators(path: str) -> dict:
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _cache_path(url: str, cache_dir: str) -> str:
+    name = os.path.basename(url.rstrip("/")) or "index"
+    return os.path.join(cache_dir, f"{name}-{hashlib.sha1(url.encode()).hexdigest()[:12]}")
+
+
+def _write_validators(path: str, url: str, response: requests.Response) -> None:
+    with open(path, "w") as file:
+        json.dump({
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified")
+        }, file)
+
+
+class CachedDownloadStream(io.RawIOBase):
+    """
+    Read-only file-like object returning a download as it arrives, while saving it to the download cache.
+
+    Data kept from an interrupted attempt is returned first, then the rest of the download. The download is saved
+    to a .part file next to the cached copy, and replaces the cached copy once commit is called, so a download
+    that was not used successfully is fetched again next time. If the connection drops, the download is resumed
+    with a Range request, from the next mirror if the current one fails.
+
+    Attributes:
+        url (str): The URL being downloaded.
+        path (str): The location of the cached copy.
+        mirrors (List[str]): The URLs the rest of the download can come from, the one in use first.
+        cached (bool): Whether the cached copy is returned as it is, because the file did not change.
+        progress_bar (Optional[tqdm]): The progress bar updated as data is read.
+    """
+    def __init__(self, session: Optional[requests.Session], url: str, path: str,
+                 response: Optional[requests.Response], progress_bar=None,
+                 mirrors: Optional[List[str]] = None, size: Optional[int] = None):
+        """
+        Args:
+            session (Optional[requests.Session]): The session used to resume the download.
+            url (str): The URL being downloaded.
+            path (str): The location of the cached copy.
+            response (Optional[requests.Response]): The response returning the rest of the download, None if the
+                cached copy is returned as it is.
+            progress_bar (Optional[tqdm]): The progress bar updated as data is read.
+            mirrors (Optional[List[str]]): The URLs the rest of the download can come from, the one the response
+                came from first. Only the URL itself if None.
+            size (Optional[int]): The size of the whole file, if the server sent it.
+        """
+        super().__init__()
+        self.url = url
+        self.path = path
+        self.mirrors = list(mirrors or [url])
+        self.progress_bar = progress_bar
+        self.cached = response is None
+        self._session = session
+        self._response = response
+        self._size = size
+        self._resumed_at = None  # The offset the download was last resumed from
+        self._stalls = 0  # The number of resumes in a row that brought no data
+        if response is None:
+            self._part = None
+            self._prefix = open(path, "rb")
+        else:
+            self._part = open(path + ".part", "ab")
+            self._prefix = open(path + ".part", "rb") if self._part.tell() else None
+        self._complete = False
+
+    def readable(self) -> bool:
+        return True
+
+    @property
+    def validators(self) -> dict:
+        """
+        The mirror, ETag and Last-Modified the returned file was served with, empty if they are unknown.
+        """
+        return _read_validators(self.path + (".json" if self._response is None else ".part.json"))
+
+    def readinto(self, buffer) -> int:
+        if self._prefix is not None:
+            length = self._prefix.readinto(buffer)
+            if length:
+                self._update_progress(length)
+                return length
+            self._prefix.close()
+            self._prefix = None
+        if self._response is None or self._complete:
+            return 0
+
+        data = self._download(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def _download(self, size: int) -> bytes:
+        """
+        Reads the next block of the download from the connection and saves it to the .part file.
+        """
+        while True:
+            try:
+                data = self._response.raw.read(size, decode_content=True)
+                break
+            except (urllib3.exceptions.HTTPError, requests.RequestException, OSError):
+                self._resume()
+        if not data:
+            self._complete = True
+            self._part.close()
+            return data
+        self._part.write(data)
+        self._update_progress(len(data))
+        return data
+
+    def fetch(self) -> None:
+        """
+        Downloads the rest of the file to the .part file without reading it, so that reading it later does not
+        wait for the network. Used to download several files at once.
+        """
+        if self._response is None or self._complete:
+            return
+        if self._prefix is None:
+            self._prefix = open(self.path + ".part", "rb")
+            self._prefix.seek(self._part.tell())
+        else:
+            self._update_progress(self._part.tell() - self._prefix.tell())
+        while self._download(BLOCK_SIZE):
+            pass
+        # Everything was counted, reading the .part file doesn't add to the progress
+        if self.progress_bar is not None:
+            self.progress_bar.close()
+            self.progress_bar = None
+
+    def _update_progress(self, length: int) -> None:
+        if self.progress_bar is not None:
+            self.progress_bar.update(length)
+
+    def _resume(self) -> None:
+        """
+        Continues the download from what was already saved, after the connection dropped.
+
+        The mirror in use is asked first, with the validator it sent so a changed file is not appended to the old
+        one. Other mirrors can't check that validator, so their part is only used if the whole file has the same
+        size. A mirror that can't continue the download is dropped, as is one whose connection keeps dropping
+        before sending anything once it was tried again RETRIES times.
+
+        Raises:
+            DownloadException: If no mirror can resume the file, for example because it changed on the server.
+        """
+        self._response.close()
+        self._part.flush()
+        offset = self._part.tell()
+        if offset == self._resumed_at:
+            self._stalls += 1
+            if self._stalls > RETRIES:
+                self.mirrors.pop(0)
+                self._stalls = 0
+            else:
+                time.sleep(RETRY_DELAY * 2 ** (self._stalls - 1))
+        else:
+            self._stalls = 0
+        self._resumed_at = offset
+        validators = _read_validators(self.path + ".part.json")
+        while self.mirrors:
+            mirror = self.mirrors[0]
+            headers = {"Accept-Encoding": "identity", "Range": f"bytes={offset}-"}
+            validator = validators.get("etag") or validators.get("last_modified")
+            if validators.get("url") == mirror and validator is not None:
+                headers["If-Range"] = validator
+            elif self._size is None:
+                self.mirrors.pop(0)  # Nothing shows the mirror would send the rest of the same file
+                continue
+            try:
+                response = _request(self._session, mirror, headers, RETRIES if len(self.mirrors) == 1 else 0)
+            except DownloadException:
+                response = None
+            if response is not None and response.status_code == 206 and \
+                    (self._size is None or _content_range_size(response) == self._size):
+                if validators.get("url") != mirror:
+                    _write_validators(self.path + ".part.json", mirror, response)
+                self._response = response
+                return
+            if response is not None:
+                response.close()
+            self.mirrors.pop(0)
+        raise DownloadException("The download was interrupted and could not be resumed, the file may have changed.")
+
+    def commit(self) -> None:
+        """
+        Makes the finished download the cached copy, used for conditional requests from then on. Any part of the
+        download that was not read yet is read first.
+        """
+        while self.read(BLOCK_SIZE):
+            pass
+        if self._response is not None:
+            os.replace(self.path + ".part", self.path)
+            os.replace(self.path + ".part.json", self.path + ".json")
+            if is_sudo_root():
+                fix_perms(self.path)
+                fix_perms(self.path + ".json")
+            self._response = None
+
+    def close(self):
+        if not self.closed:
+            for file in (self._prefix, self._part, self._response, self.progress_bar):
+                if file is not None:
+                    file.close()
+        super().close()
+
+
+def open_cached_yaml_stream(url: str, cache_dir: str, verbose: bool = False, force: bool = False,
+                            session: Optional[requests.Session] = None,
+                            mirrors: Optional[List[str]] = None) -> Optional[CachedDownloadStream]:
+    """
+    Function to download a YAML file through the download cache.
+
+    The cached copy is kept with the ETag and Last-Modified validators it was served with, so the request is
+    conditional and nothing is downloaded if the file did not change. A download interrupted in an earlier run is
+    resumed with a Range request. Validators only apply to the mirror that sent them, so they are only used while
+    that mirror is the first one. Mirrors that fail are skipped.
+
+    Args:
+        url (str): The URL of the YAML file.
+        cache_dir (str): The directory of the download cache, usually SadbConfig.download_cache_location.
+        verbose (bool): Whether to show the progress of the download.
+        force (bool): Whether to return the cached copy when the file did not change, instead of None.
+        session (Optional[requests.Session]): The session to download with, a new one if None.
+        mirrors (Optional[List[str]]): The URLs to download the file from, best first, such as the ranking made by
+            mirrors.rank_mirrors. The file is cached under url whichever mirror it comes from. Only url if None.
+
+    Returns:
+        Optional[CachedDownloadStream]: A file-like object returning the content of the YAML file, or None if the
+            cached copy is still current. Call its commit method once the content was used successfully.
+
+    Raises:
+        DownloadException: If the download fails.
+    """
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir, exist_ok=True)
+        if is_sudo_root():
+            fix_perms(cache_dir)
+    path = _cache_path(url, cache_dir)
+
+    mirrors = list(mirrors or [url])
+
+    # Byte ranges are only meaningful without a content encoding
+    headers = {"Accept-Encoding": "identity"}
+    part_validators = _read_validators(path + ".part.json")
+    part_validator = part_validators.get("etag") or part_validators.get("last_modified")
+    resuming = os.path.exists(path + ".part") and part_validators.get("url") == mirrors[0] and \
+        part_validator is not None
+    if resuming:
+        headers["Range"] = f"bytes={os.path.getsize(path + '.part')}-"
+        headers["If-Range"] = part_validator
+    elif os.path.exists(path) and _read_validators(path + ".json").get("url") == mirrors[0]:
+        validators = _read_validators(path + ".json")
+        if validators.get("etag") is not None:
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified") is not None:
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+    if session is None:
+        session = requests.Session()
+    missing = False
+    while True:
+        last = len(mirrors) == 1
+        try:
+            # Fail over to the next mirror at once, only the last one is retried
+            response = _request(session, mirrors[0], headers, RETRIES if last else 0)
+        except DownloadException:
+            if last and missing:
+                raise MissingFileException(f"{url} was not found")
+            if last:
+                raise
+        else:
+            missing = missing or response.status_code in (404, 410)
+            if last or (response.status_code < 500 and response.status_code not in (404, 410)):
+                break
+            response.close()
+        mirrors.pop(0)
+        headers = {"Accept-Encoding": "identity"}  # The validators came from another mirror
+        resuming = False
+
+    if response.status_code == 416 and resuming:
+        # The saved part can't be continued, start over
+        response.close()
+        os.remove(path + ".part")
+        return open_cached_yaml_stream(url, cache_dir, verbose, force, session, mirrors)
+    if response.status_code == 304:
+        response.close()
+        return CachedDownloadStream(None, url, path, None) if force else None
+    if response.status_code in (404, 410):
+        response.close()
+        raise MissingFileException(f"{url} was not found")
+    try:
+        response.raise_for_status()
+    except requests.HTTPError as error:
+        response.close()
+        raise DownloadException(str(error))
+
+    offset = 0
+    if response.status_code == 206:
+        offset = os.path.getsize(path + ".part")
+    else:
+        with open(path + ".part", "wb"):
+            pass  # The server sent the whole file, drop any saved part
+        _write_validators(path + ".part.json", mirrors[0], response)
+        if int(response.headers.get('content-length', 1)) == 0:
+            response.close()
+            raise DownloadException()
+
+    size = None
+    if "content-length" in response.headers:
+        size = offset + int(response.headers["content-length"])
+    if verbose:
+        progress_bar = tqdm(total=size or 0, unit='iB', unit_scale=True)
+    else:
+        progress_bar = None
+    return CachedDownloadStream(session, url, path, response, progress_bar, mirrors, size)
+
+
+class DecompressedStream(io.RawIOBase):
+    """
+    Read-only file-like object decompressing a CachedDownloadStream as it is read.
+
+    Attributes:
+        stream (CachedDownloadStream): The compressed download.
+    """
+    def __init__(self, stream: CachedDownloadStream, decompressed):
+        """
+        Args:
+            stream (CachedDownloadStream): The compressed download.
+            decompressed: A binary file-like object reading the decompressed content of the stream.
+        """
+        super().__init__()
+        self.stream = stream
+        self._decompressed = decompressed
+
+    def readable(self) -> bool:
+        return True
+
+    @property
+    def cached(self) -> bool:
+        return self.stream.cached
+
+    @property
+    def validators(self) -> dict:
+        return self.stream.validators
+
+    def readinto(self, buffer) -> int:
+        return self._decompressed.readinto(buffer)
+
+    def fetch(self) -> None:
+        """
+        Downloads the rest of the file without reading it, see CachedDownloadStream.fetch.
+        """
+        self.stream.fetch()
+
+    def commit(self) -> None:
+        """
+        Makes the finished download the cached copy, see CachedDownloadStream.commit.
+        """
+        self.stream.commit()
+
+    def close(self):
+        if not self.closed:
+            self._decompressed.close()
+            self.stream.close()
+        super().close()
+
+
+def _decompress_zstd(stream):
+    return zstandard.ZstdDecompressor().stream_reader(stream, read_across_frames=True)
+
+
+# Compressed variants of a YAML file tried before the file itself, best compressed first
+YAML_COMPRESSIONS = [
+    *([(".zst", _decompress_zstd)] if zstandard is not None else []),
+    (".xz", lambda stream: lzma.LZMAFile(stream)),
+    (".gz", lambda stream: gzip.GzipFile(fileobj=stream))
+]
+
+
+def open_compressed_yaml_stream(url: str, cache_dir: str, verbose: bool = False, force: bool = False,
+                                session: Optional[requests.Session] = None,
+                                mirrors: Optional[List[str]] = None) -> Optional[io.RawIOBase]:
+    """
+    Function to download a YAML file through the download cache, preferring a compressed variant of it.
+
+    The .zst, .xz and .gz variants are tried in turn, and the first one published is decompressed as it
+    downloads. If none is published the file itself is downloaded. The variant served is remembered in the
+    download cache and tried first next time, so a better variant published later is only used once it stops
+    being served.
+
+    Args:
+        url (str): The URL of the YAML file.
+        cache_dir (str): The directory of the download cache, usually SadbConfig.download_cache_location.
+        verbose (bool): Whether to show the progress of the download.
+        force (bool): Whether to return the cached copy when the file did not change, instead of None.
+        session (Optional[requests.Session]): The session to download with, a new one if None.
+        mirrors (Optional[List[str]]): The URLs to download the YAML file from, best first. Only url if None.
+
+    Returns:
+        Optional[io.RawIOBase]: A file-like object returning the content of the YAML file, or None if the cached
+            copy is still current. Call its commit method once the content was used successfully.
+
+    Raises:
+        DownloadException: If the download fails.
+    """
+    mirrors = mirrors or [url]
+    variant_path = _cache_path(url, cache_dir) + ".variant"
+    try:
+        with open(variant_path) as file:
+            served = file.read()
+    except OSError:
+        served = None
+    # The file itself comes last, the variant served last time first
+    variants = sorted(YAML_COMPRESSIONS + [("", None)], key=lambda variant: variant[0] != served)
+    for index, (extension, decompress) in enumerate(variants):
+        try:
+            stream = open_cached_yaml_stream(
+                url + extension, cache_dir, verbose, force, session, [mirror + extension for mirror in mirrors]
+            )
+        except MissingFileException:
+            if index == len(variants) - 1:
+                raise
+            continue
+        if extension != served:
+            with open(variant_path, "w") as file:
+                file.write(extension)
+            if is_sudo_root():
+                fix_perms(variant_path)
+        if stream is None:
+            return None
+        return stream if decompress is None else DecompressedStream(stream, decompress(stream))
+
+
+def open_yaml_streams(urls: List[str], cache_dir: str, verbose: bool = False, force: bool = False,
+                      mirrors: Optional[Dict[str, List[str]]] = None) -> Optional[List[io.RawIOBase]]:
+    """
+    Function to download several YAML files at once through the download cache, see open_compressed_yaml_stream.
+
+    The files are downloaded by a pool of threads sharing one session, so the total time is about that of the
+    slowest download. A single file is not downloaded ahead, so it can be parsed while it downloads.
+
+    Args:
+        urls (List[str]): The URLs of the YAML files.
+        cache_dir (str): The directory of the download cache, usually SadbConfig.download_cache_location.
+        verbose (bool): Whether to show the progress of the downloads.
+        force (bool): Whether to return the files when none of them changed, instead of None.
+        mirrors (Optional[Dict[str, List[str]]]): The URLs to download each file from, best first, for the URLs
+            that have mirrors.
+
+    Returns:
+        Optional[List[io.RawIOBase]]: File-like objects returning the content of each YAML file, in the order of
+            the URLs, or None if none of the cached copies changed. Call the commit method of each once the
+            content was used successfully.
+
+    Raises:
+        DownloadException: If a download fails.
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=MAX_PARALLEL_DOWNLOADS)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    def download(url: str) -> io.RawIOBase:
+        # The cached copies of unchanged files are still needed to merge them with the changed ones
+        stream = open_compressed_yaml_stream(url, cache_dir, verbose, True, session, (mirrors or {}).get(url))
+        if len(urls) > 1:
+            try:
+                stream.fetch()
+            except BaseException:
+                stream.close()
+                raise
+        return stream
+
+    with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_DOWNLOADS, len(urls))) as executor:
+        futures = [executor.submit(download, url) for url in urls]
+    streams = [future.result() for future in futures if future.exception() is None]
+    if len(streams) < len(futures):
+        for stream in streams:
+            stream.close()
+        for future in futures:
+            if future.exception() is not None:
+                raise future.exception()
+
+    if not force and all(stream.cached for stream in streams):
+        for stream in streams:
+            stream.close()
+        return None
+    return streams
@@ -0,0 +1,193 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set
+
+# Event masks from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# Changes to the entries of a directory, as made when apps are installed, updated or removed
+DEFAULT_MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+
+_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len, followed by the null padded name
+
+
+class InotifyEvent(NamedTuple):
+    path: str  # The watched path
+    name: str  # The entry of the watched directory that changed, empty for the directory itself
+    mask: int
+
+
+class Inotify:
+    """
+    A minimal wrapper of the Linux inotify API, using ctypes so no extra dependency is needed.
+
+    Attributes:
+        fd (int): The inotify file descriptor.
+    """
+    def __init__(self):
+        """
+        Creates a new inotify instance.
+
+        Raises:
+            OSError: If inotify is not available.
+        """
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self._paths = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def add_watch(self, path: str, mask: int = DEFAULT_MASK) -> int:
+        """
+        Watches the given path for the given events.
+
+        Args:
+            path (str): The file or directory to watch.
+            mask (int): The events to watch for.
+
+        Returns:
+            int: The watch descriptor.
+
+        Raises:
+            OSError: If the path can't be watched.
+        """
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), ctypes.c_uint32(mask))
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+        self._paths[wd] = path
+        return wd
+
+    def read(self, timeout: Optional[float] = None) -> List[InotifyEvent]:
+        """
+        Returns the events that happened since the last read, waiting for one if there are none.
+
+        Args:
+            timeout (Optional[float]): The number of seconds to wait for an event, None to wait forever.
+
+        Returns:
+            List[InotifyEvent]: The events, empty if the timeout passed without any.
+        """
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            events.append(InotifyEvent(self._paths.get(wd, ""), name, mask))
+        return events
+
+    def close(self) -> None:
+        """
+        Stops watching and closes the inotify file descriptor.
+        """
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def watch(paths: Iterable[str], debounce: float = 0.5) -> Iterator[Dict[str, Set[str]]]:
+    """
+    Watches the given directories and yields their changes, grouping bursts of events.
+
+    After an event, events keep being collected until none happens for debounce seconds, so installing an app,
+    which touches many files, is reported once.
+
+    Directories that don't exist yet are watched for through their nearest existing parent, and watched themselves
+    once they appear.
+
+    Args:
+        paths (Iterable[str]): The directories to watch.
+        debounce (float): The number of quiet seconds ending a burst of events.
+
+    Returns:
+        Iterator[Dict[str, Set[str]]]: For each burst, the names of the entries that changed in each watched path.
+            A watched path whose events overflowed the queue, or that appeared during the burst, maps to an empty set
+            as its changes before it was watched are unknown.
+    """
+    paths = list(paths)
+    with Inotify() as inotify:
+        pending = set(paths)
+        _add_watches(inotify, pending)
+        while True:
+            events = inotify.read()
+            while True:
+                more_events = inotify.read(debounce)
+                if not more_events:
+                    break
+                events += more_events
+
+            changes = {}
+            overflowed = False
+            for event in events:
+                if event.mask & IN_Q_OVERFLOW:
+                    overflowed = True
+                elif event.path in paths and event.path not in pending:
+                    changes.setdefault(event.path, set()).add(event.name)
+            if pending and (overflowed or any(event.mask & (IN_CREATE | IN_MOVED_TO) for event in events)):
+                for path in _add_watches(inotify, pending):
+                    changes[path] = set()
+            if overflowed:
+                changes = {path: set() for path in paths if path not in pending}
+            if changes:
+                yield changes
+
+
+def _add_watches(inotify: Inotify, pending: Set[str]) -> List[str]:
+    """
+    Watches the pending directories that exist, removing them from pending, and the nearest existing parent of
+    the others so their creation is noticed.
+
+    Args:
+        inotify (Inotify): The inotify instance to add the watches to.
+        pending (Set[str]): The directories not watched yet.
+
+    Returns:
+        List[str]: The directories that are now watched.
+    """
+    added = []
+    for path in sorted(pending):
+        if os.path.isdir(path):
+            try:
+                inotify.add_watch(path)
+            except OSError:
+                continue  # Removed again in the meantime, or not readable
+            pending.discard(path)
+            added.append(path)
+            continue
+        parent = os.path.dirname(os.path.abspath(path))
+        while not os.path.isdir(parent) and parent != os.path.dirname(parent):
+            parent = os.path.dirname(parent)
+        try:
+            inotify.add_watch(parent)  # Watching a directory again keeps its watch descriptor
+        except OSError:
+            pass
+    return added
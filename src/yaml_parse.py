@@ -1,7 +1,42 @@
 import yaml
-from typing import List
+from typing import IO, Iterable, Iterator, List, Union
 from sadb import App, Pricing, MobileType, StillRating
 
+# Use the libyaml bindings when PyYAML was built with them, they are several times faster
+try:
+    from yaml import CSafeLoader as Loader, CSafeDumper as Dumper
+    YAML_BACKEND = "libyaml"
+except ImportError:
+    from yaml import SafeLoader as Loader, SafeDumper as Dumper
+    YAML_BACKEND = "python"
+
+
+def safe_load(yml: Union[str, bytes, IO]):
+    """
+    Function to parse a YAML document with the fastest available safe loader.
+
+    Args:
+        yml (Union[str, bytes, IO]): The YAML document, or a file-like object to read it from.
+
+    Returns:
+        The parsed document.
+    """
+    return yaml.load(yml, Loader=Loader)
+
+
+def safe_dump(data, **kwargs) -> str:
+    """
+    Function to serialize data to YAML with the fastest available safe dumper.
+
+    Args:
+        data: The data to serialize.
+        **kwargs: Options passed to yaml.dump, such as sort_keys.
+
+    Returns:
+        str: The YAML document.
+    """
+    return yaml.dump(data, Dumper=Dumper, **kwargs)
+
 
 def get_apps_from_yaml_path(path: str) -> List[App]:
     """
@@ -27,24 +62,138 @@ def get_apps_from_yaml(yml: str) -> List[App]:
     Returns:
         List[App]: A list of apps.
     """
-    apps = yaml.safe_load(yml)
-
-    app_list = []
-    for key, value in apps.items():
-        app = App(
-            key, value.get("name", None), value.get("primary_src", None),
-            value.get("src_pkg_name", None), value.get("icon_url", None),
-            value.get("author", None), value.get("summary", None),
-            value.get("description", None), value.get("categories", None),
-            value.get("keywords", None), value.get("mimetypes", None),
-            value.get("license", None), enum_getter(Pricing, value.get("pricing", None)),
-            enum_getter(MobileType, value.get("mobile", None)), enum_getter(StillRating, value.get("still_rating", None)),
-            value.get("still_rating_notes", None), value.get("homepage", None),
-            value.get("donate_url", None), value.get("screenshot_urls", None),
-            value.get("demo_url", None), value.get("addons", None)
-        )
-        app_list.append(app)
-    return app_list
+    apps = safe_load(yml)
+    return [app_from_yaml_data(key, value) for key, value in apps.items()]
+
+
+def iter_apps_from_yaml(stream: Union[str, bytes, IO]) -> Iterator[App]:
+    """
+    Function to lazily get apps from a YAML document, one top level entry at a time.
+
+    Only the entry being parsed is kept in memory, so the document can be a file or a download
+    that hasn't finished yet.
+
+    Args:
+        stream (Union[str, bytes, IO]): The YAML document, or a file-like object to read it from.
+
+    Yields:
+        App: The apps, in the order they appear in the document.
+
+    Raises:
+        yaml.YAMLError: If the document is not valid YAML or is not a mapping of app ids to apps.
+    """
+    loader = Loader(stream)
+    try:
+        loader.get_event()  # StreamStartEvent
+        if loader.check_event(yaml.StreamEndEvent):
+            return
+        loader.get_event()  # DocumentStartEvent
+        if not loader.check_event(yaml.MappingStartEvent):
+            raise yaml.YAMLError("The repo YAML must be a mapping of app ids to apps")
+        loader.get_event()
+
+        anchors = {}
+        while not loader.check_event(yaml.MappingEndEvent):
+            key = loader.construct_document(_compose_node(loader, anchors))
+            value = loader.construct_document(_compose_node(loader, anchors))
+            yield app_from_yaml_data(key, value)
+    finally:
+        loader.dispose()
+
+
+def iter_apps_from_yamls(streams: Iterable[Union[str, bytes, IO]]) -> Iterator[App]:
+    """
+    Function to lazily merge the apps of several YAML documents, such as the catalogs of several repositories.
+
+    The documents are layered by priority: an app whose id or package name was already given by an earlier
+    document is skipped.
+
+    Args:
+        streams (Iterable[Union[str, bytes, IO]]): The YAML documents, highest priority first.
+
+    Yields:
+        App: The merged apps.
+    """
+    app_ids = set()
+    pkg_names = set()
+    for stream in streams:
+        layer_ids = set()
+        layer_pkgs = set()
+        for app in iter_apps_from_yaml(stream):
+            if app.app_id in app_ids or app.src_pkg_name in pkg_names:
+                continue
+            layer_ids.add(app.app_id)
+            layer_pkgs.add(app.src_pkg_name)
+            yield app
+        app_ids |= layer_ids
+        pkg_names |= layer_pkgs
+
+
+def _compose_node(loader: Loader, anchors: dict) -> yaml.Node:
+    """
+    Builds the node for the next value in the event stream, like yaml's Composer does for a whole document.
+    """
+    event = loader.get_event()
+    if isinstance(event, yaml.AliasEvent):
+        if event.anchor not in anchors:
+            raise yaml.YAMLError(f"Found undefined alias {event.anchor}")
+        return anchors[event.anchor]
+
+    if isinstance(event, yaml.ScalarEvent):
+        tag = event.tag
+        if tag is None or tag == "!":
+            tag = loader.resolve(yaml.ScalarNode, event.value, event.implicit)
+        node = yaml.ScalarNode(tag, event.value, event.start_mark, event.end_mark, style=event.style)
+        if event.anchor is not None:
+            anchors[event.anchor] = node
+        return node
+
+    tag = event.tag
+    if isinstance(event, yaml.SequenceStartEvent):
+        if tag is None or tag == "!":
+            tag = loader.resolve(yaml.SequenceNode, None, event.implicit)
+        node = yaml.SequenceNode(tag, [], event.start_mark, None, flow_style=event.flow_style)
+        if event.anchor is not None:
+            anchors[event.anchor] = node
+        while not loader.check_event(yaml.SequenceEndEvent):
+            node.value.append(_compose_node(loader, anchors))
+    else:  # MappingStartEvent
+        if tag is None or tag == "!":
+            tag = loader.resolve(yaml.MappingNode, None, event.implicit)
+        node = yaml.MappingNode(tag, [], event.start_mark, None, flow_style=event.flow_style)
+        if event.anchor is not None:
+            anchors[event.anchor] = node
+        while not loader.check_event(yaml.MappingEndEvent):
+            item_key = _compose_node(loader, anchors)
+            item_value = _compose_node(loader, anchors)
+            node.value.append((item_key, item_value))
+    node.end_mark = loader.get_event().end_mark
+    return node
+
+
+def app_from_yaml_data(key: str, value: dict) -> App:
+    """
+    Function to create an app from an entry of a repo YAML file.
+
+    Args:
+        key (str): The id of the app.
+        value (dict): The fields of the app.
+
+    Returns:
+        App: The app.
+    """
+    return App(
+        key, value.get("name", None), value.get("primary_src", None),
+        value.get("src_pkg_name", None), value.get("icon_url", None),
+        value.get("author", None), value.get("summary", None),
+        value.get("description", None), value.get("categories", None),
+        value.get("keywords", None), value.get("mimetypes", None),
+        value.get("license", None), enum_getter(Pricing, value.get("pricing", None)),
+        enum_getter(MobileType, value.get("mobile", None)), enum_getter(StillRating, value.get("still_rating", None)),
+        value.get("still_rating_notes", None), value.get("homepage", None),
+        value.get("donate_url", None), value.get("screenshot_urls", None),
+        value.get("demo_url", None), value.get("addons", None)
+    )
 
 
 def enum_getter(enum, value):
@@ -85,4 +234,4 @@ def app_to_yaml(app: App) -> str:
         "demo_url": app.demo_url,
         "addons": app.addons
     }}
-    return yaml.dump(app_dict, sort_keys=False)
+    return safe_dump(app_dict, sort_keys=False)